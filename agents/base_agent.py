@@ -4,36 +4,64 @@ from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain.tools import BaseTool
 from langchain.memory import ConversationBufferMemory
 from langchain_openai import ChatOpenAI
+from functools import cached_property, lru_cache
+import asyncio
 import os
+import weakref
+
+# Built once at import time; subclasses may swap in their own template
+_BASE_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "You are Hana-chan, a warm, friendly, and mildly energetic AI companion! 🌸 You're caring and approachable, with a gentle personality that makes people feel comfortable. Keep your responses concise and genuine!"),
+    MessagesPlaceholder(variable_name="chat_history"),
+    ("human", "{input}"),
+    MessagesPlaceholder(variable_name="agent_scratchpad"),
+])
+
+@lru_cache(maxsize=1)
+def get_shared_llm() -> ChatOpenAI:
+    """Return the chat model shared by every agent so they reuse one connection pool."""
+    return ChatOpenAI(
+        model="gpt-4",
+        temperature=0.7,  # Increased for more creative, fun, and varied responses
+        api_key=os.getenv("OPENAI_API_KEY")
+    )
+
+# Upper bound on in-flight LLM calls, sized to the provider's rate limit
+_LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "16"))
+_llm_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+def llm_semaphore() -> asyncio.Semaphore:
+    """Return the semaphore bounding concurrent LLM calls on the running event loop."""
+    # asyncio primitives are bound to a single loop, so keep one per loop
+    loop = asyncio.get_running_loop()
+    semaphore = _llm_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _llm_semaphores[loop] = asyncio.Semaphore(_LLM_CONCURRENCY)
+    return semaphore
 
 class BaseAgent:
     def __init__(self, tools: List[BaseTool] = None):
-        self.llm = ChatOpenAI(
-            model="gpt-4",
-            temperature=0.7,  # Increased for more creative, fun, and varied responses
-            api_key=os.getenv("OPENAI_API_KEY")
-        )
+        self.llm = get_shared_llm()
         self.tools = tools or []
         self.memory = ConversationBufferMemory(
             memory_key="chat_history",
             return_messages=True
         )
         
-        # Create the agent
-        self.prompt = ChatPromptTemplate.from_messages([
-            ("system", "You are Hana-chan, a warm, friendly, and mildly energetic AI companion! 🌸 You're caring and approachable, with a gentle personality that makes people feel comfortable. Keep your responses concise and genuine!"),
-            MessagesPlaceholder(variable_name="chat_history"),
-            ("human", "{input}"),
-            MessagesPlaceholder(variable_name="agent_scratchpad"),
-        ])
-        
-        self.agent = create_openai_functions_agent(
+        self.prompt = _BASE_PROMPT
+    
+    @cached_property
+    def agent(self):
+        # Built on first access only - process() implementations call their tools directly
+        return create_openai_functions_agent(
             llm=self.llm,
             tools=self.tools,
             prompt=self.prompt
         )
-        
-        self.agent_executor = AgentExecutor(
+    
+    @cached_property
+    def agent_executor(self) -> AgentExecutor:
+        return AgentExecutor(
             agent=self.agent,
             tools=self.tools,
             memory=self.memory,
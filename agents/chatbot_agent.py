@@ -1,11 +1,23 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, AsyncIterator, Optional, Tuple
 from langchain.tools import BaseTool
 from langchain.memory import ConversationBufferMemory
 from langchain.agents import AgentExecutor, create_openai_functions_agent
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
 from pydantic import Field
-from .base_agent import BaseAgent
+from .base_agent import BaseAgent, llm_semaphore
+import asyncio
 import json
+import os
+import threading
+from collections import OrderedDict, deque
+
+# Exact-match cache for replies to short openers/acknowledgements ("hi", "thanks!")
+_REPLY_CACHE_SIZE = int(os.getenv("REPLY_CACHE_SIZE", "512"))
+_REPLY_CACHE_MAX_WORDS = 3
+
+# Per-session window of recent turns kept by the agent (the tool only reads the last few)
+_SESSION_CACHE_SIZE = int(os.getenv("CHAT_SESSION_CACHE_SIZE", "1000"))
+_SESSION_HISTORY_LEN = 10
 
 class ResponseGenerationTool(BaseTool):
     name: str = "response_generation"
@@ -17,6 +29,18 @@ class ResponseGenerationTool(BaseTool):
         self.llm = llm
     
     def _run(self, input_str: str) -> str:
+        prompt, message = self._build_prompt(input_str)
+        if prompt is None:
+            return "Error: Invalid input format"
+        
+        response = self.llm.invoke(prompt)
+        if hasattr(response, 'content'):
+            response = response.content
+        
+        return self._limit_length(str(response), message)
+    
+    def _build_prompt(self, input_str: str) -> Tuple[str, str]:
+        """Build the Hana-chan prompt; returns (prompt, user message), or (None, "") on bad input."""
         # Parse the input string to extract message, context, and history
         try:
             # Split the input string into its components
@@ -41,7 +65,7 @@ class ResponseGenerationTool(BaseTool):
                     except:
                         history = []
         except:
-            return "Error: Invalid input format"
+            return None, ""
         
         # Format context for the prompt
         context_str = ""
@@ -169,19 +193,19 @@ Respond as Hana-chan with warmth, mild energy, and genuine care! Keep it short,
 
 IMPORTANT: Match your response length to the user's input - if they wrote more than 3 words, don't reply with more than 8 times their input length. Keep it conversational and appropriately sized! 🌸"""
         
-        response = self.llm.invoke(prompt)
-        if hasattr(response, 'content'):
-            response = response.content
-        
-        # Post-process to ensure dynamic length limits based on user input
-        response_text = str(response)
-        
-        # Calculate dynamic length limit based on user input
+        return prompt, message
+    
+    @staticmethod
+    def _max_words(message: str) -> int:
+        """Calculate dynamic length limit based on user input"""
         user_words = len(message.split())
         if user_words <= 3:
-            max_words = 80  # Default limit for very short inputs
-        else:
-            max_words = user_words * 8  # 8 times the user input length
+            return 80  # Default limit for very short inputs
+        return user_words * 8  # 8 times the user input length
+    
+    def _limit_length(self, response_text: str, message: str) -> str:
+        """Post-process to ensure dynamic length limits based on user input"""
+        max_words = self._max_words(message)
         
         # Apply the calculated word limit
         words = response_text.split()
@@ -199,7 +223,32 @@ IMPORTANT: Match your response length to the user's input - if they wrote more t
         return response_text
     
     async def _arun(self, input_str: str) -> str:
-        return self._run(input_str)
+        async with llm_semaphore():
+            return await asyncio.to_thread(self._run, input_str)
+    
+    async def astream(self, input_str: str) -> AsyncIterator[str]:
+        """Yield response tokens as the model produces them, stopping at the word limit."""
+        prompt, message = self._build_prompt(input_str)
+        if prompt is None:
+            yield "Error: Invalid input format"
+            return
+        max_words = self._max_words(message)
+        # Running whitespace-separated word count, so each token costs O(len(token))
+        word_count = 0
+        mid_word = False
+        async with llm_semaphore():
+            async for chunk in self.llm.astream(prompt):
+                token = chunk.content if hasattr(chunk, 'content') else str(chunk)
+                yield token
+                if not token:
+                    continue
+                words = len(token.split())
+                if mid_word and not token[0].isspace():
+                    words -= 1  # continues the previous token's word
+                word_count += words
+                mid_word = not token[-1].isspace()
+                if word_count > max_words:
+                    break
 
 class ChatbotAgent(BaseAgent):
     def __init__(self):
@@ -226,18 +275,117 @@ class ChatbotAgent(BaseAgent):
             tools=self.tools,
             verbose=True
         )
+        
+        # Shared by every session using this agent, hence the lock
+        self._reply_cache: OrderedDict = OrderedDict()
+        self._reply_cache_lock = threading.Lock()
+        
+        # session_id -> deque of that session's most recent messages (LRU over sessions)
+        self.sessions: OrderedDict = OrderedDict()
+        self._sessions_lock = threading.Lock()
     
-    async def process(self, input_data: Dict[str, Any]) -> str:
+    def _session_history(self, session_id: Any, seed_history: Optional[List[Dict[str, str]]] = None) -> deque:
+        with self._sessions_lock:
+            history = self.sessions.get(session_id)
+            if history is None:
+                history = deque((seed_history or [])[-_SESSION_HISTORY_LEN:], maxlen=_SESSION_HISTORY_LEN)
+                self.sessions[session_id] = history
+                if len(self.sessions) > _SESSION_CACHE_SIZE:
+                    self.sessions.popitem(last=False)
+            else:
+                self.sessions.move_to_end(session_id)
+            return history
+    
+    def begin_turn(self, session_id: Any, message: str, context: Dict[str, Any], user_profile: Dict[str, Any],
+                   seed_history: Optional[List[Dict[str, str]]] = None) -> Dict[str, Any]:
+        """Build the input for a new message from the agent's own window of this session's turns.
+        
+        Callers only send the new message; seed_history is read once, when the session is first seen.
+        """
+        history = self._session_history(session_id, seed_history)
+        return {
+            "message": message,
+            "context": context,
+            "history": [*history, {"role": "user", "content": message}],
+            "user_profile": user_profile
+        }
+    
+    def end_turn(self, session_id: Any, message: str, response: str) -> None:
+        """Append a completed exchange to the session window."""
+        self._session_history(session_id).extend((
+            {"role": "user", "content": message},
+            {"role": "assistant", "content": response}
+        ))
+    
+    def end_session(self, session_id: Any) -> None:
+        """Forget a session's window (turns are already saved to the database as they happen)."""
+        with self._sessions_lock:
+            self.sessions.pop(session_id, None)
+    
+    def _reply_key(self, input_data: Dict[str, Any]) -> Optional[str]:
+        """Cache key for short messages (normalized text + user context/profile); None if not cacheable."""
+        message = input_data.get("message", "").strip().lower()
+        if not message or len(message.split()) > _REPLY_CACHE_MAX_WORDS:
+            return None
+        return json.dumps(
+            [message, input_data.get("context", {}), input_data.get("user_profile", {})],
+            sort_keys=True, default=str
+        )
+    
+    def cached_reply(self, input_data: Dict[str, Any]) -> Optional[str]:
+        """Return a previously generated reply for the same short message and user, if any."""
+        key = self._reply_key(input_data)
+        if key is None:
+            return None
+        with self._reply_cache_lock:
+            response = self._reply_cache.get(key)
+            if response is not None:
+                self._reply_cache.move_to_end(key)
+            return response
+    
+    def remember_reply(self, input_data: Dict[str, Any], response: str) -> None:
+        """Store a reply so the next identical short message skips the LLM."""
+        key = self._reply_key(input_data)
+        if key is None or response.startswith("Error"):
+            return
+        with self._reply_cache_lock:
+            self._reply_cache[key] = response
+            self._reply_cache.move_to_end(key)
+            if len(self._reply_cache) > _REPLY_CACHE_SIZE:
+                self._reply_cache.popitem(last=False)
+    
+    def _tool_input(self, input_data: Dict[str, Any]) -> str:
         message = input_data.get("message", "")
         context = input_data.get("context", {})
         history = input_data.get("history", [])
         user_profile = input_data.get("user_profile", {})
         
         # Prepare input for the tool including user profile information
-        tool_input = f"Message: {message}\nContext: {json.dumps(context)}\nHistory: {json.dumps(history)}\nUserProfile: {json.dumps(user_profile)}"
+        return f"Message: {message}\nContext: {json.dumps(context)}\nHistory: {json.dumps(history)}\nUserProfile: {json.dumps(user_profile)}"
+    
+    async def process(self, input_data: Dict[str, Any]) -> str:
+        cached = self.cached_reply(input_data)
+        if cached is not None:
+            return cached
+        
+        tool_input = self._tool_input(input_data)
         
         # Get response from the tool
         response = await self.tools[0]._arun(tool_input)
         
         # Return just the response text
-        return str(response) 
\ No newline at end of file
+        response = str(response)
+        self.remember_reply(input_data, response)
+        return response
+    
+    def process_stream(self, input_data: Dict[str, Any]) -> AsyncIterator[str]:
+        """Stream the response token by token so the UI can render before the reply is complete."""
+        return self.tools[0].astream(self._tool_input(input_data))
+    
+    def finalize_response(self, streamed: str, message: str) -> str:
+        """Apply the same length post-processing as process() to a streamed reply.
+        
+        The stream stops just past the word limit, so the result may be shorter than what was
+        shown; callers re-render the reply with it when they differ.
+        """
+        return self.tools[0]._limit_length(streamed, message) 
\ No newline at end of file
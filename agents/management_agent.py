@@ -1,6 +1,6 @@
 from typing import Dict, Any, List
 from langchain.tools import BaseTool
-from .base_agent import BaseAgent
+from .base_agent import BaseAgent, llm_semaphore
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain.agents import create_openai_functions_agent, AgentExecutor
 from langchain_core.language_models import BaseLanguageModel
@@ -61,7 +61,8 @@ Rate with positivity and energy! 🌸🎊"""
             }
     
     async def _arun(self, conversation: List[Dict[str, str]]) -> Dict[str, float]:
-        return self._run(conversation)
+        async with llm_semaphore():
+            return await asyncio.to_thread(self._run, conversation)
 
 class SatisfactionAssessmentTool(BaseTool):
     name: str = "satisfaction_assessment"
@@ -103,7 +104,8 @@ Just give me one number between 0 and 1 - and remember, let's celebrate the good
             return 0.7  # Default score if parsing fails
     
     async def _arun(self, conversation: List[Dict[str, str]], user_context: Dict[str, Any]) -> float:
-        return self._run(conversation, user_context)
+        async with llm_semaphore():
+            return await asyncio.to_thread(self._run, conversation, user_context)
 
 class RecommendationTool(BaseTool):
     name: str = "recommendation_generation"
@@ -137,7 +139,8 @@ Format each awesome recommendation on a new line starting with a dash (-). Make
         return [r.strip('- ').strip() for r in recommendations.split('\n') if r.strip()]
     
     async def _arun(self, quality_metrics: Dict[str, float], satisfaction: float) -> List[str]:
-        return self._run(quality_metrics, satisfaction)
+        async with llm_semaphore():
+            return await asyncio.to_thread(self._run, quality_metrics, satisfaction)
 
 class SentimentAnalysisTool(BaseTool):
     name: str = "sentiment_analysis"
@@ -214,7 +217,8 @@ Make it warm and insightful! 🌸"""
             }
     
     async def _arun(self, conversation: List[Dict[str, str]]) -> Dict[str, Any]:
-        return self._run(conversation)
+        async with llm_semaphore():
+            return await asyncio.to_thread(self._run, conversation)
 
 class ManagementAgent(BaseAgent):
     def __init__(self):
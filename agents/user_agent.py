@@ -1,20 +1,132 @@
-from typing import Dict, Any
+from typing import Dict, Any, AsyncIterator, Callable, Optional, Tuple, TypedDict
 from langchain.tools import BaseTool
 from langchain_community.tools.requests.tool import RequestsGetTool
 from langchain_community.utilities.requests import TextRequestsWrapper
 from bs4 import BeautifulSoup
 from pydantic import Field
 from langchain_core.language_models import BaseLanguageModel
-from langchain.agents import AgentExecutor, create_openai_functions_agent
+from langchain.agents import AgentExecutor
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
 import asyncio
 import concurrent.futures
+import functools
+from collections import OrderedDict
+from functools import cached_property
+import logging
+import os
 import re
 import requests
+import time
 import urllib.parse
-from .base_agent import BaseAgent
+from .base_agent import BaseAgent, llm_semaphore
 import json
 
+_cache_logger = logging.getLogger("user_agent.cache")
+_CACHE_LOG_EVERY = 50
+_cache_stats: Dict[str, Dict[str, int]] = {}
+
+def async_lru(maxsize: int = 128, ttl: float = 3600, cache_if: Callable[[Any], bool] = None):
+    """Memoize an async tool method on its (JSON-serializable) arguments, recording hit/miss stats.
+    
+    Entries expire after ttl seconds; results rejected by cache_if (e.g. fallbacks after a failed
+    scrape or LLM call) are returned but not stored. Concurrent misses on one key share a single call.
+    """
+    def decorator(func):
+        cache: OrderedDict = OrderedDict()  # key -> (stored_at, result)
+        inflight: Dict[str, asyncio.Future] = {}
+        stats = _cache_stats.setdefault(func.__qualname__, {"hits": 0, "misses": 0})
+        
+        async def compute(self, key, args, kwargs):
+            future = asyncio.get_running_loop().create_future()
+            inflight[key] = future
+            try:
+                result = await func(self, *args, **kwargs)
+            except BaseException as e:
+                if isinstance(e, asyncio.CancelledError):
+                    future.cancel()
+                else:
+                    future.set_exception(e)
+                    future.exception()  # mark retrieved; waiters re-raise it themselves
+                raise
+            finally:
+                if inflight.get(key) is future:
+                    del inflight[key]
+            future.set_result(result)
+            if cache_if is None or cache_if(result):
+                cache[key] = (time.monotonic(), result)
+                if len(cache) > maxsize:
+                    cache.popitem(last=False)
+            return result
+        
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            key = json.dumps([args, kwargs], sort_keys=True, default=str)
+            entry = cache.get(key)
+            if entry is not None and time.monotonic() - entry[0] > ttl:
+                del cache[key]
+                entry = None
+            pending = inflight.get(key)
+            if entry is not None:
+                cache.move_to_end(key)
+                stats["hits"] += 1
+                result = entry[1]
+            elif pending is not None and pending.get_loop() is asyncio.get_running_loop():
+                # Another caller is already computing this key; wait for its result
+                stats["hits"] += 1
+                try:
+                    result = await asyncio.shield(pending)
+                except asyncio.CancelledError:
+                    if not pending.cancelled():
+                        raise
+                    result = await compute(self, key, args, kwargs)
+            else:
+                stats["misses"] += 1
+                result = await compute(self, key, args, kwargs)
+            
+            calls = stats["hits"] + stats["misses"]
+            if calls % _CACHE_LOG_EVERY == 0:
+                _cache_logger.info(
+                    "%s cache: %d hits / %d misses (%.0f%% hit rate, %d/%d entries)",
+                    func.__qualname__, stats["hits"], stats["misses"],
+                    100.0 * stats["hits"] / calls, len(cache), maxsize
+                )
+            return result
+        
+        wrapper.cache_clear = cache.clear
+        return wrapper
+    return decorator
+
+def get_cache_stats() -> Dict[str, Dict[str, int]]:
+    """Return a snapshot of hit/miss counters for every memoized analysis tool."""
+    return {name: dict(stats) for name, stats in _cache_stats.items()}
+
+_ANALYSIS_CACHE_SIZE = int(os.getenv("ANALYSIS_CACHE_SIZE", "128"))
+_ANALYSIS_CACHE_TTL = float(os.getenv("ANALYSIS_CACHE_TTL", "3600"))
+
+# URL -> platform lookup, compiled once and scanned in order. Each pattern anchors the
+# domain at a hostname boundary so e.g. "netflix.com" is not mistaken for "x.com".
+_PLATFORM_PATTERNS = tuple((re.compile(rf'(?:^|[/.@]){domain}(?:[/:?#]|$)', re.IGNORECASE), info) for domain, info in [
+    (r'instagram\.com', {'platform': 'Instagram', 'type': 'photo/video sharing', 'blocked': True}),
+    (r'(?:twitter|x)\.com', {'platform': 'Twitter/X', 'type': 'microblogging', 'blocked': True}),
+    (r'threads\.(?:com|net)', {'platform': 'Threads', 'type': 'text-based social', 'blocked': True}),
+    (r'linkedin\.com', {'platform': 'LinkedIn', 'type': 'professional networking', 'blocked': False}),
+    (r'facebook\.com', {'platform': 'Facebook', 'type': 'social networking', 'blocked': True}),
+    (r'tiktok\.com', {'platform': 'TikTok', 'type': 'short video content', 'blocked': True}),
+    (r'youtube\.com', {'platform': 'YouTube', 'type': 'video content', 'blocked': False}),
+])
+
+# Content-cleanup patterns used on every scraped page
+_CONTENT_CLASS_RE = re.compile(r'content|main|post')
+_WHITESPACE_RE = re.compile(r'\s+')
+_NON_ASCII_RE = re.compile(r'[^\x00-\x7F]+')
+
+# Built once at import time and shared by every UserAgent instance
+_USER_AGENT_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "You are Hana-chan's super enthusiastic profile analyzer! 🎯✨ You love discovering awesome things about people and getting excited about their interests and social media! Analyze with energy and positivity! 🌸🎉"),
+    ("human", "{input}"),
+    MessagesPlaceholder(variable_name="agent_scratchpad"),
+])
+
 class ProfileAnalysisTool(BaseTool):
     name: str = "profile_analysis"
     description: str = "Analyzes user profile data and provides insights"
@@ -25,9 +137,16 @@ class ProfileAnalysisTool(BaseTool):
         self.llm = llm
     
     def _run(self, profile: Dict[str, Any]) -> str:
+        analysis = self._template_analysis(profile)
+        if analysis is None:
+            analysis = self.llm.invoke(self._analysis_prompt(profile))
+            if hasattr(analysis, 'content'):
+                analysis = analysis.content
+        return str(analysis)
+    
+    def _template_analysis(self, profile: Dict[str, Any]) -> Optional[str]:
+        """Template analysis for basic profiles, or None if the profile needs the LLM."""
         # Quick validation and formatting without LLM for basic profiles
-        name = profile.get('name', 'Not provided')
-        age = profile.get('age', 'Not provided')
         interests = profile.get('interests', 'Not provided')
         
         # If profile is minimal, return a quick template-based response
@@ -47,22 +166,7 @@ CONVERSATION TOPICS:
         
         # Only use LLM for complex profiles with substantial content
         if len(str(interests)) > 50:
-            prompt = f"""OMG, I'm SO excited to analyze this amazing person! 🎉✨ Let me dive into their awesome profile!
-
-Name: {name} (what a great name! 😄), Age: {age}, Occupation: {profile.get('occupation', 'Not specified')}, Interests: {interests}
-
-I need to create an ENERGETIC and POSITIVE analysis! Please format it like this:
-
-KEY INTERESTS: [2-3 main interests with enthusiasm!]
-PERSONALITY TRAITS: [2-3 positive traits with energy!]
-CONVERSATION TOPICS: [2-3 exciting topics to chat about!]
-
-Make it sound fun, warm, and exciting! Use lots of positive energy! 🌸🎊"""
-            
-            analysis = self.llm.invoke(prompt)
-            if hasattr(analysis, 'content'):
-                analysis = analysis.content
-            return str(analysis)
+            return None
         else:
             # Template-based response for simple interests
             interests_list = str(interests).split(',')[:3]
@@ -77,8 +181,32 @@ CONVERSATION TOPICS:
 {chr(10).join(f'- {interest.strip()}-related discussions' for interest in interests_list[:2])}
 - Personal experiences and stories"""
     
+    def _analysis_prompt(self, profile: Dict[str, Any]) -> str:
+        name = profile.get('name', 'Not provided')
+        age = profile.get('age', 'Not provided')
+        interests = profile.get('interests', 'Not provided')
+        return f"""OMG, I'm SO excited to analyze this amazing person! 🎉✨ Let me dive into their awesome profile!
+
+Name: {name} (what a great name! 😄), Age: {age}, Occupation: {profile.get('occupation', 'Not specified')}, Interests: {interests}
+
+I need to create an ENERGETIC and POSITIVE analysis! Please format it like this:
+
+KEY INTERESTS: [2-3 main interests with enthusiasm!]
+PERSONALITY TRAITS: [2-3 positive traits with energy!]
+CONVERSATION TOPICS: [2-3 exciting topics to chat about!]
+
+Make it sound fun, warm, and exciting! Use lots of positive energy! 🌸🎊"""
+    
+    @async_lru(maxsize=_ANALYSIS_CACHE_SIZE, ttl=_ANALYSIS_CACHE_TTL)
     async def _arun(self, profile: Dict[str, Any]) -> str:
-        return self._run(profile)
+        # Template profiles never reach the model, so only the LLM call holds a limiter slot
+        analysis = self._template_analysis(profile)
+        if analysis is None:
+            async with llm_semaphore():
+                analysis = await asyncio.to_thread(self.llm.invoke, self._analysis_prompt(profile))
+            if hasattr(analysis, 'content'):
+                analysis = analysis.content
+        return str(analysis)
 
 class SocialMediaAnalysisTool(BaseTool):
     name: str = "social_media_analysis"
@@ -94,23 +222,10 @@ class SocialMediaAnalysisTool(BaseTool):
     
     def _get_platform_info(self, url: str) -> Dict[str, str]:
         """Extract platform information from URL"""
-        url_lower = url.lower()
-        if 'instagram.com' in url_lower:
-            return {'platform': 'Instagram', 'type': 'photo/video sharing', 'blocked': True}
-        elif 'twitter.com' in url_lower or 'x.com' in url_lower:
-            return {'platform': 'Twitter/X', 'type': 'microblogging', 'blocked': True}
-        elif 'threads.com' in url_lower:
-            return {'platform': 'Threads', 'type': 'text-based social', 'blocked': True}
-        elif 'linkedin.com' in url_lower:
-            return {'platform': 'LinkedIn', 'type': 'professional networking', 'blocked': False}
-        elif 'facebook.com' in url_lower:
-            return {'platform': 'Facebook', 'type': 'social networking', 'blocked': True}
-        elif 'tiktok.com' in url_lower:
-            return {'platform': 'TikTok', 'type': 'short video content', 'blocked': True}
-        elif 'youtube.com' in url_lower:
-            return {'platform': 'YouTube', 'type': 'video content', 'blocked': False}
-        else:
-            return {'platform': 'Unknown', 'type': 'social media', 'blocked': False}
+        for pattern, info in _PLATFORM_PATTERNS:
+            if pattern.search(url):
+                return dict(info)
+        return {'platform': 'Unknown', 'type': 'social media', 'blocked': False}
     
     def _fallback_scrape(self, url: str) -> str:
         """Fallback scraping method with different strategies"""
@@ -173,7 +288,7 @@ class SocialMediaAnalysisTool(BaseTool):
             script.decompose()
         
         # Try to find main content areas
-        main_content = soup.find('main') or soup.find('article') or soup.find('div', class_=re.compile(r'content|main|post'))
+        main_content = soup.find('main') or soup.find('article') or soup.find('div', class_=_CONTENT_CLASS_RE)
         
         if main_content:
             text = main_content.get_text(separator=' ', strip=True)
@@ -181,8 +296,8 @@ class SocialMediaAnalysisTool(BaseTool):
             text = soup.get_text(separator=' ', strip=True)
         
         # Clean and validate text
-        text = re.sub(r'\s+', ' ', text)  # Remove extra whitespace
-        text = re.sub(r'[^\x00-\x7F]+', ' ', text)  # Remove non-ASCII characters that might cause encoding issues
+        text = _WHITESPACE_RE.sub(' ', text)  # Remove extra whitespace
+        text = _NON_ASCII_RE.sub(' ', text)  # Remove non-ASCII characters that might cause encoding issues
         
         # Check if content is meaningful (not just error pages or empty content)
         if len(text.strip()) < 50:
@@ -482,8 +597,13 @@ Note: Analysis based on URL patterns and platform behavior, not actual content."
                     return url, None, f"Content not accessible: {str(primary_error)[:100]}"
     
     def _run(self, urls: list) -> str:
+        return self._analyze(urls)[0]
+    
+    def _prepare(self, urls: list) -> Tuple[Optional[str], str, bool]:
+        """Scrape up to 3 URLs (no LLM call). Returns (prompt, text, complete): when prompt is None,
+        text is already the final analysis; otherwise it holds the platform notes for the summary."""
         if not urls:
-            return "No social media links provided."
+            return None, "No social media links provided.", True
         
         # Limit to first 3 URLs for performance
         urls = urls[:3]
@@ -492,6 +612,7 @@ Note: Analysis based on URL patterns and platform behavior, not actual content."
         contents = []
         errors = []
         analyzed_platforms = []
+        complete = True
         
         with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
             future_to_url = {executor.submit(self._fetch_url_content, url): url for url in urls}
@@ -506,12 +627,14 @@ Note: Analysis based on URL patterns and platform behavior, not actual content."
                         analyzed_platforms.append(f"{platform} (URL Analysis)")
                     elif "⚠️ CONTENT NOT ACCESSIBLE" in content:
                         analyzed_platforms.append(f"{platform} (Limited Analysis)")
+                        complete = False
                     else:
                         analyzed_platforms.append(f"{platform} (Content Scraped)")
                     contents.append(content)
                 elif error:
                     errors.append(f"Issue with {platform}: {error}")
                     analyzed_platforms.append(f"{platform} (Failed)")
+                    complete = False
         
         if not contents and errors:
             # If no content was extracted, provide analysis based on URLs
@@ -524,21 +647,17 @@ Note: Analysis based on URL patterns and platform behavior, not actual content."
                 except Exception:
                     platform_analysis.append(f"- {platform_info['platform']}: {platform_info['type']}")
             
-            return f"""⚠️ SOCIAL MEDIA ANALYSIS FROM URL PATTERNS ⚠️
+            return None, f"""⚠️ SOCIAL MEDIA ANALYSIS FROM URL PATTERNS ⚠️
 
 {chr(10).join(platform_analysis)}
 
-Note: Analysis based on URL structure and platform behavior patterns due to access restrictions."""
+Note: Analysis based on URL structure and platform behavior patterns due to access restrictions.""", False
         
         if not contents:
-            return "⚠️ Unable to analyze social media content due to access restrictions."
-        
-        # Prepare summary with platform analysis notes
-        summary_parts = []
+            return None, "⚠️ Unable to analyze social media content due to access restrictions.", False
         
-        if analyzed_platforms:
-            platform_note = f"📊 ANALYSIS METHODS: {', '.join(analyzed_platforms)}"
-            summary_parts.append(platform_note)
+        # Platform analysis notes, shown above the model's summary
+        notes = f"📊 ANALYSIS METHODS: {', '.join(analyzed_platforms)}" if analyzed_platforms else ""
         
         # Combine all content and analyze in a single LLM call
         combined_content = " ".join(contents)[:3000]  # Increased limit for URL analysis content
@@ -557,23 +676,25 @@ PERSONALITY INSIGHTS: [wonderful personality traits - focus on the positives! 
 
 Make this analysis WARM, ENERGETIC, and EXCITING! Use positive language and make it sound like we're discovering something amazing about this fantastic person! Focus on actionable insights that will make conversations more fun! 🌸🎊"""
         
-        try:
-            summary = self.llm.invoke(prompt)
-            if hasattr(summary, 'content'):
-                summary = summary.content
-            
-            # Combine platform notes with LLM summary
-            if summary_parts:
-                return f"{chr(10).join(summary_parts)}\n\n{str(summary)}"
-            else:
-                return str(summary)
-                
-        except Exception as e:
-            # Fallback to template-based analysis if LLM fails
-            instagram_count = sum(1 for url in urls if 'instagram.com' in url.lower())
-            twitter_count = sum(1 for url in urls if any(domain in url.lower() for domain in ['twitter.com', 'x.com']))
-            
-            base_summary = f"""SOCIAL MEDIA ANALYSIS SUMMARY:
+        return prompt, notes, complete
+    
+    def _summary_with_notes(self, notes: str, summary: Any) -> str:
+        if hasattr(summary, 'content'):
+            summary = summary.content
+        
+        # Combine platform notes with LLM summary
+        if notes:
+            return f"{notes}\n\n{str(summary)}"
+        else:
+            return str(summary)
+    
+    def _fallback_analysis(self, urls: list, notes: str, error: Exception) -> str:
+        """Template-based analysis used when the LLM call fails"""
+        urls = urls[:3]
+        instagram_count = sum(1 for url in urls if 'instagram.com' in url.lower())
+        twitter_count = sum(1 for url in urls if any(domain in url.lower() for domain in ['twitter.com', 'x.com']))
+        
+        base_summary = f"""SOCIAL MEDIA ANALYSIS SUMMARY:
 
 PLATFORMS DETECTED:
 - Instagram links: {instagram_count}
@@ -591,14 +712,47 @@ CONVERSATION TOPICS:
 - Visual content and photography (if Instagram user)
 - Current events and opinions (if Twitter/X user)
 - Digital communication preferences"""
-            
-            if summary_parts:
-                return f"{chr(10).join(summary_parts)}\n\n{base_summary}"
-            else:
-                return f"{base_summary}\n\nNote: Analysis error occurred: {str(e)[:100]}"
+        
+        if notes:
+            return f"{notes}\n\n{base_summary}"
+        else:
+            return f"{base_summary}\n\nNote: Analysis error occurred: {str(error)[:100]}"
+    
+    def _analyze(self, urls: list) -> Tuple[str, bool]:
+        """Analyze up to 3 URLs; returns (analysis, complete), where complete is False if any
+        scrape or the LLM call failed and the analysis is a fallback."""
+        prompt, text, complete = self._prepare(urls)
+        if prompt is None:
+            return text, complete
+        try:
+            summary = self.llm.invoke(prompt)
+        except Exception as e:
+            # Fallback to template-based analysis if LLM fails
+            return self._fallback_analysis(urls, text, e), False
+        return self._summary_with_notes(text, summary), complete
+    
+    @async_lru(maxsize=_ANALYSIS_CACHE_SIZE, ttl=_ANALYSIS_CACHE_TTL, cache_if=lambda outcome: outcome[1])
+    async def analyze(self, urls: list) -> Tuple[str, bool]:
+        """Async _analyze; only complete analyses are cached, so failed scrapes are retried."""
+        # Scraping runs outside the LLM limiter; only the model call holds a slot
+        prompt, text, complete = await asyncio.to_thread(self._prepare, urls)
+        if prompt is None:
+            return text, complete
+        try:
+            async with llm_semaphore():
+                summary = await asyncio.to_thread(self.llm.invoke, prompt)
+        except Exception as e:
+            return self._fallback_analysis(urls, text, e), False
+        return self._summary_with_notes(text, summary), complete
     
     async def _arun(self, urls: list) -> str:
-        return self._run(urls)
+        analysis, _ = await self.analyze(urls)
+        return analysis
+
+class UserContext(TypedDict):
+    profile_analysis: str
+    social_analysis: str
+    combined_context: str
 
 class UserAgent(BaseAgent):
     def __init__(self):
@@ -610,24 +764,19 @@ class UserAgent(BaseAgent):
             SocialMediaAnalysisTool(llm=self.llm)
         ]
         
-        # Create the prompt template
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", "You are Hana-chan's super enthusiastic profile analyzer! 🎯✨ You love discovering awesome things about people and getting excited about their interests and social media! Analyze with energy and positivity! 🌸🎉"),
-            ("human", "{input}"),
-            MessagesPlaceholder(variable_name="agent_scratchpad"),
-        ])
-        
-        # Create the agent
-        agent = create_openai_functions_agent(self.llm, self.tools, prompt)
-        
-        # Create the agent executor
-        self.agent_executor = AgentExecutor(
-            agent=agent,
+        self.prompt = _USER_AGENT_PROMPT
+    
+    @cached_property
+    def agent_executor(self) -> AgentExecutor:
+        # process() always runs both tools itself, so the function-calling planner
+        # is only constructed for callers that explicitly ask for it
+        return AgentExecutor(
+            agent=self.agent,
             tools=self.tools,
             verbose=True
         )
     
-    async def process(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def process(self, input_data: Dict[str, Any]) -> UserContext:
         user_profile = input_data.get("user_profile", {})
         social_links = input_data.get("social_links", [])
         
@@ -638,11 +787,36 @@ class UserAgent(BaseAgent):
         # Wait for both to complete
         profile_analysis, social_analysis = await asyncio.gather(profile_task, social_task)
         
-        # Combine the analyses into a comprehensive user context
-        user_context = {
+        # Combine the analyses into a comprehensive user context. Callers subscript
+        # and JSON-serialize it, so it stays a plain dict; a constant-key literal is
+        # already allocated at its final size.
+        user_context: UserContext = {
             "profile_analysis": profile_analysis,
             "social_analysis": social_analysis,
             "combined_context": f"User Profile: {profile_analysis}\nSocial Media Analysis: {social_analysis}"
         }
         
-        return user_context 
\ No newline at end of file
+        return user_context
+    
+    async def process_single(self, url: str) -> Dict[str, Any]:
+        """Analyze one URL: its URL-structure breakdown plus a social media analysis of just that link."""
+        social_tool = self.tools[1]
+        url_analysis = social_tool._advanced_url_analysis(url)
+        url_analysis['url'] = url
+        url_analysis['insights'], url_analysis['analysis_complete'] = await social_tool.analyze([url])
+        return url_analysis
+    
+    async def process_stream(self, input_data: Dict[str, Any]) -> AsyncIterator[Tuple[str, str]]:
+        """Yield (name, analysis) pairs as each analysis finishes, fastest first."""
+        user_profile = input_data.get("user_profile", {})
+        social_links = input_data.get("social_links", [])
+        
+        async def labelled(name: str, coro) -> Tuple[str, str]:
+            return name, await coro
+        
+        pending = [
+            labelled("profile_analysis", self.tools[0]._arun(user_profile)),
+            labelled("social_analysis", self.tools[1]._arun(social_links))
+        ]
+        for next_done in asyncio.as_completed(pending):
+            yield await next_done 
\ No newline at end of file
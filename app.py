@@ -1,15 +1,178 @@
 import streamlit as st
 import asyncio
-from agents.user_agent import UserAgent
-from agents.chatbot_agent import ChatbotAgent
-from agents.management_agent import ManagementAgent
+import html
 from database import Database
 from auth import SimpleAuth, show_login_page
 from admin_config import AdminConfig
 import json
 import os
+import re
+import threading
 import time
+from concurrent.futures import Future
 from datetime import datetime
+from urllib.parse import urlparse
+
+# Social profile domains (subdomains included) mapped to the profile form field they pre-fill
+_HOST_TO_KIND = {
+    'instagram.com': 'instagram',
+    'twitter.com': 'twitter',
+    'x.com': 'twitter',
+    'threads.com': 'threads',
+    'threads.net': 'threads',
+    'linkedin.com': 'linkedin',
+}
+
+# Profile setup link inputs: (link kind, label, placeholder)
+_SOCIAL_PROVIDERS = (
+    ('instagram', "📸 Instagram Profile", "https://www.instagram.com/username/"),
+    ('twitter', "🐦 Twitter/X Profile", "https://twitter.com/username"),
+    ('threads', "🧵 Threads Profile", "https://www.threads.com/@username"),
+    ('linkedin', "💼 LinkedIn Profile", "https://www.linkedin.com/in/username/"),
+)
+
+# Most recent messages rendered in the chat view
+_CHAT_RENDER_LIMIT = 50
+
+# Users rendered per page in User Management
+_USERS_PER_PAGE = 20
+
+# Placeholder values from the docs/.env template that are not real API keys
+_PLACEHOLDER_KEY_RE = re.compile(r'^sk-your-|placeholder|your-api-key', re.IGNORECASE)
+
+# Profile occupation choices and their selectbox positions
+_OCCUPATION_OPTIONS = (
+    "Select your occupation...",
+    "Student",
+    "Software Engineer",
+    "Teacher/Educator",
+    "Healthcare Worker",
+    "Artist/Creative Professional",
+    "Business Professional",
+    "Entrepreneur",
+    "Engineer (Non-Software)",
+    "Marketing/Sales",
+    "Finance/Accounting",
+    "Lawyer/Legal Professional",
+    "Researcher/Scientist",
+    "Designer (Graphic/UX/UI)",
+    "Writer/Journalist",
+    "Consultant",
+    "Manager/Executive",
+    "Customer Service",
+    "Retail/Service Industry",
+    "Government/Public Service",
+    "Non-Profit Worker",
+    "Freelancer/Self-Employed",
+    "Retired",
+    "Unemployed/Job Seeking",
+    "Other",
+)
+_OCCUPATION_INDEX = {option: i for i, option in enumerate(_OCCUPATION_OPTIONS)}
+
+# Chat page header; {name} is filled with the HTML-escaped user name
+_CHAT_HEADER_TMPL = (
+    '<div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); '
+    'color: white; padding: 20px; border-radius: 15px; margin-bottom: 20px; text-align: center;">'
+    '<h2>💬 Chat with Hana-chan</h2>'
+    "<p>Hey {name}! 👋 Let's have a conversation!</p>"
+    '</div>'
+)
+
+# Supported-platform badges shown on the social media analysis page
+_PLATFORM_BADGES_HTML = (
+    '<div style="display: flex; justify-content: space-around; flex-wrap: wrap;">'
+    '<span>📱 <b>Instagram</b></span><span>🐦 <b>Twitter/X</b></span><span>🧵 <b>Threads</b></span>'
+    '<span>💼 <b>LinkedIn</b></span><span>🎵 <b>TikTok</b></span><span>📺 <b>YouTube</b></span>'
+    '</div>'
+)
+
+# One collapsible day of the My Account daily breakdown; every value is HTML-escaped by the caller
+_DAILY_BREAKDOWN_TMPL = (
+    '<details><summary>{date} - {count} conversations</summary>'
+    '<p><span>Daily Mood: {mood_emoji} <b>{mood}/1.0</b></span> &nbsp; '
+    '<span>Energy Level: {energy_emoji} <b>{energy}/1.0</b></span></p>'
+    '<p><b>Daily Summary:</b></p><ul>{bullets}</ul>'
+    '</details>'
+)
+
+# Animated dots shown in Hana-chan's bubble until the first streamed token arrives
+_TYPING_INDICATOR_HTML = """
+<div class="typing-indicator">
+    <div class="typing-circle"></div>
+    <div class="typing-circle"></div>
+    <div class="typing-circle"></div>
+</div>
+
+<style>
+.typing-indicator {
+    display: flex;
+    align-items: center;
+    gap: 4px;
+}
+
+.typing-circle {
+    width: 8px;
+    height: 8px;
+    border-radius: 50%;
+    background-color: #999;
+    animation: typing 1.4s ease-in-out infinite;
+}
+
+.typing-circle:nth-child(1) {
+    animation-delay: 0ms;
+}
+
+.typing-circle:nth-child(2) {
+    animation-delay: 200ms;
+}
+
+.typing-circle:nth-child(3) {
+    animation-delay: 400ms;
+}
+
+@keyframes typing {
+    0%, 60%, 100% {
+        transform: translateY(0);
+        opacity: 0.4;
+    }
+    30% {
+        transform: translateY(-10px);
+        opacity: 1;
+    }
+}
+</style>
+"""
+
+def _link_kind(url):
+    """Classify a social profile URL by its hostname (not by substrings elsewhere in the URL)."""
+    if '://' not in url:
+        url = '//' + url
+    host = urlparse(url.strip()).hostname or ''
+    # Exact domain or any subdomain of it (www., m., mobile., uk. ...)
+    for domain, kind in _HOST_TO_KIND.items():
+        if host == domain or host.endswith('.' + domain):
+            return kind
+    return None
+
+def _context_text(user_context, key):
+    """Return a stored analysis as text; the save path already writes strings, so this is usually a no-op."""
+    value = user_context[key]
+    return value if isinstance(value, str) else json.dumps(value, default=str)
+
+def _truncate(text, limit):
+    """Shorten text to limit characters, marking the cut with '...'."""
+    return text if len(text) <= limit else text[:limit] + "..."
+
+def _chat_pairs_markdown(pairs, limit=None, divider=False):
+    """Format chat pairs as one markdown string so a session renders as a single element."""
+    blocks = []
+    for j, pair in enumerate(pairs, 1):
+        message, response = pair['message'], pair['response']
+        if limit:
+            message, response = _truncate(message, limit), _truncate(response, limit)
+        blocks.append(f"**Chat {j}:**\n\n**You:** {message}\n\n**Hana-chan:** {response}")
+    return ("\n\n---\n\n" if divider else "\n\n").join(blocks)
 
 # Load environment variables only if OPENAI_API_KEY is not already set
 if not os.environ.get("OPENAI_API_KEY"):
@@ -18,7 +181,7 @@ if not os.environ.get("OPENAI_API_KEY"):
 
 # Check for API key and validate it's not a placeholder
 api_key = os.environ.get("OPENAI_API_KEY")
-if not api_key or api_key.startswith("sk-your-") or "placeholder" in api_key.lower() or "your-api-key" in api_key.lower():
+if not api_key or _PLACEHOLDER_KEY_RE.search(api_key):
     st.error("""
     🔑 **OpenAI API Key Required**
     
@@ -36,13 +199,41 @@ if not api_key or api_key.startswith("sk-your-") or "placeholder" in api_key.low
     """)
     st.stop()
 
-# Initialize agents and database
-user_agent = UserAgent()
-chatbot_agent = ChatbotAgent()
-management_agent = ManagementAgent()
-db = Database()
-auth = SimpleAuth()
-admin_config = AdminConfig()
+# Agents, database and auth helpers are built once per process and shared
+# across reruns and sessions instead of being reconstructed on every rerun.
+# The agent modules pull in langchain/openai, so they are imported on first use
+# rather than at the top of the script (the login page never needs them).
+@st.cache_resource
+def get_user_agent():
+    from agents.user_agent import UserAgent
+    return UserAgent()
+
+@st.cache_resource
+def get_chatbot_agent():
+    from agents.chatbot_agent import ChatbotAgent
+    return ChatbotAgent()
+
+@st.cache_resource
+def get_management_agent():
+    from agents.management_agent import ManagementAgent
+    return ManagementAgent()
+
+@st.cache_resource
+def get_database():
+    return Database()
+
+@st.cache_resource
+def get_auth():
+    return SimpleAuth()
+
+@st.cache_resource
+def get_admin_config():
+    return AdminConfig()
+
+# Initialize database and auth helpers (agents are created lazily via the getters above)
+db = get_database()
+auth = get_auth()
+admin_config = get_admin_config()
 
 # Initialize session state
 if 'user_context' not in st.session_state:
@@ -59,24 +250,143 @@ if 'user_id' not in st.session_state:
     st.session_state.user_id = None
 if 'social_analysis_results' not in st.session_state:
     st.session_state.social_analysis_results = {}
-if 'chat_loading' not in st.session_state:
-    st.session_state.chat_loading = False
-if 'pending_message' not in st.session_state:
-    st.session_state.pending_message = None
 if 'last_analysis_time' not in st.session_state:
     st.session_state.last_analysis_time = None
 if 'last_input' not in st.session_state:
     st.session_state.last_input = ""
 if 'authenticated' not in st.session_state:
     st.session_state.authenticated = False
-if 'cached_session_conversations' not in st.session_state:
-    st.session_state.cached_session_conversations = None
-if 'cached_user_id' not in st.session_state:
-    st.session_state.cached_user_id = None
-if 'cached_daily_summaries' not in st.session_state:
-    st.session_state.cached_daily_summaries = None
-if 'cached_recent_sentiment' not in st.session_state:
-    st.session_state.cached_recent_sentiment = None
+if 'pending_profile_save' not in st.session_state:
+    st.session_state.pending_profile_save = None
+
+@st.cache_resource
+def get_event_loop():
+    """One event loop per process, running forever on a daemon thread.
+    
+    Tasks scheduled on it (e.g. the post-reply conversation analysis) keep running
+    after the script run that started them returns. Coroutines executed here must
+    not touch st.session_state; they return results for the script thread to apply.
+    """
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="async-loop", daemon=True).start()
+    return loop
+
+def run_async(coro):
+    """Run a coroutine on the shared event loop and wait for its result."""
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop()).result()
+
+_ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", "2"))
+
+@st.cache_resource
+def get_analysis_queue():
+    """Process-wide queue of post-reply conversation analyses, drained by a few workers on the shared loop."""
+    loop = get_event_loop()
+    
+    async def make_queue():
+        return asyncio.Queue()
+    
+    queue = run_async(make_queue())
+    
+    async def worker():
+        while True:
+            job, future = await queue.get()
+            try:
+                future.set_result(await background_conversation_analysis(**job))
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                queue.task_done()
+    
+    for _ in range(_ANALYSIS_WORKERS):
+        asyncio.run_coroutine_threadsafe(worker(), loop)
+    return queue
+
+def queue_conversation_analysis(**job):
+    """Enqueue an analysis job from the script thread; returns a future for its result."""
+    future = Future()
+    queue = get_analysis_queue()
+    get_event_loop().call_soon_threadsafe(queue.put_nowait, (job, future))
+    return future
+
+def _clear_on_first(placeholder, chunks):
+    """Yield chunks, emptying the placeholder (e.g. a typing indicator) when the first one arrives."""
+    cleared = False
+    for chunk in chunks:
+        if not cleared:
+            placeholder.empty()
+            cleared = True
+        yield chunk
+
+def iter_async(agen):
+    """Drive an async generator from script code on the shared loop (e.g. for st.write_stream)."""
+    while True:
+        try:
+            yield run_async(agen.__anext__())
+        except StopAsyncIteration:
+            return
+
+# Short-lived caches for the admin pages so widget reruns don't re-query every user.
+# Call .clear() after writes that change the underlying rows.
+@st.cache_data(ttl=30, show_spinner=False)
+def _cached_user_count():
+    return db.get_user_count()
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _cached_users_page(offset, limit):
+    return db.get_users_page(limit, offset)
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _cached_system_stats():
+    """Admin panel statistics, fetched together so they share one cache entry."""
+    return {
+        'total_users': db.get_user_count(),
+        'total_conversations': db.get_total_conversation_count(),
+        'auth_type_counts': db.get_user_counts_by_auth_type(),
+        'recent_users': db.get_recent_users(limit=5)
+    }
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _cached_admin_list():
+    return admin_config.get_all_admins()
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _cached_conv_counts():
+    return db.get_conversation_counts_by_user()
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _cached_conv_count(user_id):
+    return db.get_user_conversation_count(user_id)
+
+@st.cache_data(ttl=120, show_spinner=False)
+def _cached_session_conversations(user_id, limit, latest_id):
+    """Chat sessions for a user; latest_id changes whenever a conversation is saved, so new chats show up."""
+    return db.get_user_conversations_by_session(user_id, limit=limit)
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _cached_daily_summary(user_id):
+    return db.get_daily_sentiment_summary(user_id, days=7)
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _cached_recent_sentiment(user_id):
+    return db.get_recent_sentiment_analysis(user_id, limit=3)
+
+@st.cache_data(ttl=60, show_spinner=False)
+def load_recent_history(user_id):
+    """Recent conversations flattened to oldest-first chat messages (the query already orders them)."""
+    return [
+        message
+        for conv in db.get_user_conversations(user_id, limit=20)
+        for message in ({"role": "user", "content": conv['message']},
+                        {"role": "assistant", "content": conv['response']})
+    ]
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _admin_emails():
+    return frozenset(admin_config.get_active_admins())
+
+def is_admin_email(email):
+    """Check admin membership against the cached admin set (same normalization as AdminConfig.is_admin)."""
+    return bool(email) and email.lower().strip() in _admin_emails()
 
 def main():
     # Check authentication first
@@ -86,7 +396,30 @@ def main():
     
     st.title("🌸 Hana-chan's Social Media & Chat System")
     
-    # Get current user info for display
+    # Finish a profile save once its background analysis is done; until then
+    # keep polling so the page stays usable
+    pending_save = st.session_state.pending_profile_save
+    if pending_save is not None:
+        if pending_save.done():
+            st.session_state.pending_profile_save = None
+            saved, social_analysis = pending_save.result()
+            if saved:
+                # The profile and social analyses ran concurrently in one call;
+                # reuse the social half instead of re-scraping
+                if social_analysis:
+                    st.session_state.social_analysis_results = social_analysis
+                _cached_users_page.clear()
+                auth.invalidate_current_user()
+                st.success("✅ Profile updated successfully!")
+            else:
+                st.error("❌ Failed to update profile.")
+        else:
+            watch_profile_save()
+    
+    # Pick up a conversation analysis that finished since the last rerun
+    apply_conversation_analysis()
+    
+    # Get current user once per run; the pages below reuse it
     current_user = auth.get_current_user()
     if current_user:
         # User info in sidebar
@@ -102,12 +435,8 @@ def main():
         
         # Logout button
         if st.sidebar.button("Logout"):
+            get_chatbot_agent().end_session(current_user['id'])
             auth.logout()
-            # Clear all cached data on logout
-            st.session_state.cached_user_id = None
-            st.session_state.cached_session_conversations = None
-            st.session_state.cached_daily_summaries = None
-            st.session_state.cached_recent_sentiment = None
             st.rerun()
     
     # Sidebar for navigation
@@ -117,11 +446,10 @@ def main():
         "📱 Social Media Analysis"
     ]
     
-    # Check if current user is admin
-    current_user = auth.get_current_user()
+    # Check if current user is admin (reuses the user fetched above)
     is_admin = False
     if current_user and current_user.get('email'):
-        is_admin = admin_config.is_admin(current_user['email'])
+        is_admin = is_admin_email(current_user['email'])
     
     # Add admin options if user is admin
     if is_admin:
@@ -135,25 +463,24 @@ def main():
     page = st.sidebar.selectbox("Choose a page", navigation_options)
     
     if page == "🏠 Profile Setup":
-        show_profile_setup()
+        show_profile_setup(current_user)
     elif page == "💬 Hana Chat":
-        show_chat()
+        show_chat(current_user)
     elif page == "📱 Social Media Analysis":
         show_social_media_analysis()
     elif page == "👥 User Management" and is_admin:
-        show_user_management()
+        show_user_management(current_user)
     elif page == "⚙️ Admin Panel" and is_admin:
-        show_admin_panel()
+        show_admin_panel(current_user)
     elif page == "👤 My Account":
-        show_my_account()
+        show_my_account(current_user)
     else:
         st.error("Access denied or page not found")
 
-def show_profile_setup():
+def show_profile_setup(current_user):
     st.header("👤 User Profile Setup")
     
-    # Get current user
-    current_user = auth.get_current_user()
+    # Require the user main() already loaded
     if not current_user:
         st.error("User not found!")
         return
@@ -171,7 +498,7 @@ def show_profile_setup():
         st.markdown(f"**Member since:** {current_user.get('created_at', 'Unknown')}")
         
         # Show conversation count
-        conv_count = db.get_user_conversation_count(current_user['id'])
+        conv_count = _cached_conv_count(current_user['id'])
         st.markdown(f"**Total conversations:** {conv_count}")
     
     st.markdown("---")
@@ -188,7 +515,7 @@ def show_profile_setup():
             
             if st.button("Re-analyze Social Media"):
                 with st.spinner("Re-analyzing your social media profiles..."):
-                    result = asyncio.run(analyze_social_media_urls(current_user['social_links']))
+                    result = analyze_social_media_urls(current_user['social_links'])
                     st.session_state.social_analysis_results = result
                     st.success("✅ Social media analysis updated!")
                     st.rerun()
@@ -206,44 +533,13 @@ def show_profile_setup():
             )
             
             # Add occupation field
-            occupation_options = [
-                "Select your occupation...",
-                "Student",
-                "Software Engineer", 
-                "Teacher/Educator",
-                "Healthcare Worker",
-                "Artist/Creative Professional",
-                "Business Professional",
-                "Entrepreneur",
-                "Engineer (Non-Software)",
-                "Marketing/Sales",
-                "Finance/Accounting",
-                "Lawyer/Legal Professional",
-                "Researcher/Scientist",
-                "Designer (Graphic/UX/UI)",
-                "Writer/Journalist",
-                "Consultant",
-                "Manager/Executive",
-                "Customer Service",
-                "Retail/Service Industry",
-                "Government/Public Service",
-                "Non-Profit Worker",
-                "Freelancer/Self-Employed",
-                "Retired",
-                "Unemployed/Job Seeking",
-                "Other"
-            ]
-            
             current_occupation = current_user.get('occupation', '')
-            # Find the index of current occupation, default to 0 if not found
-            try:
-                occupation_index = occupation_options.index(current_occupation) if current_occupation in occupation_options else 0
-            except ValueError:
-                occupation_index = 0
+            # Position of the current occupation, default to 0 if not found
+            occupation_index = _OCCUPATION_INDEX.get(current_occupation, 0)
             
             occupation = st.selectbox(
                 "Occupation", 
-                options=occupation_options,
+                options=_OCCUPATION_OPTIONS,
                 index=occupation_index,
                 help="Choose your occupation or job type"
             )
@@ -264,34 +560,21 @@ def show_profile_setup():
             
             st.subheader("📱 Update Social Media Links")
             
-            # Pre-fill existing social media links
+            # Pre-fill existing social media links, classifying each link once
             existing_links = current_user.get('social_links', [])
+            prefills = dict.fromkeys(_HOST_TO_KIND.values(), '')
+            for link in existing_links:
+                kind = _link_kind(link)
+                # Keep the first link of each kind, as the inputs always have
+                if kind and not prefills[kind]:
+                    prefills[kind] = link
             
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                instagram = st.text_input(
-                    "📸 Instagram Profile", 
-                    value=next((link for link in existing_links if 'instagram.com' in link), ''),
-                    placeholder="https://www.instagram.com/username/"
-                )
-                twitter = st.text_input(
-                    "🐦 Twitter/X Profile", 
-                    value=next((link for link in existing_links if 'twitter.com' in link or 'x.com' in link), ''),
-                    placeholder="https://twitter.com/username"
-                )
-            
-            with col2:
-                threads = st.text_input(
-                    "🧵 Threads Profile", 
-                    value=next((link for link in existing_links if 'threads.com' in link), ''),
-                    placeholder="https://www.threads.com/@username"
-                )
-                linkedin = st.text_input(
-                    "💼 LinkedIn Profile", 
-                    value=next((link for link in existing_links if 'linkedin.com' in link), ''),
-                    placeholder="https://www.linkedin.com/in/username/"
-                )
+            # Two inputs per column, in _SOCIAL_PROVIDERS order
+            columns = st.columns(2)
+            link_inputs = []
+            for index, (kind, label, placeholder) in enumerate(_SOCIAL_PROVIDERS):
+                with columns[index // 2]:
+                    link_inputs.append(st.text_input(label, value=prefills[kind], placeholder=placeholder))
             
             if st.form_submit_button("Update Profile", type="primary"):
                 # Validate name
@@ -300,8 +583,10 @@ def show_profile_setup():
                     return
                 
                 # Collect all social media links
-                social_links = [link.strip() for link in [instagram, twitter, threads, linkedin] 
-                              if link and link.strip()]
+                # (one pass over the inputs, stripping each link once; stays a list
+                # because it is stored as the JSON list)
+                social_links = [stripped for link in link_inputs
+                                if link and (stripped := link.strip())]
                 
                 # Update profile
                 profile_updates = {
@@ -312,29 +597,25 @@ def show_profile_setup():
                     'social_links': social_links
                 }
                 
-                # Process with user agent if social links changed
+                # Process with user agent if the set of social links changed (order and repeats don't matter)
                 existing_links = current_user.get('social_links', [])
-                if social_links != existing_links or not current_user.get('user_context'):
-                    with st.spinner("🔄 Re-analyzing your profile..."):
-                        result = asyncio.run(process_user_profile({
-                            'name': name.strip(),
-                            'occupation': occupation if occupation != "Select your occupation..." else '',
-                            'age': age,
-                            'interests': interests
-                        }, social_links))
-                        
-                        profile_updates['user_context'] = {
-                            "profile_analysis": str(result["profile_analysis"]),
-                            "social_analysis": str(result["social_analysis"]),
-                            "combined_context": str(result["combined_context"])
-                        }
-                
-                # Save updates to database
-                if db.update_user_profile(current_user['id'], profile_updates):
-                    st.success("✅ Profile updated successfully!")
-                    st.rerun()
+                if set(social_links) != set(existing_links) or not current_user.get('user_context'):
+                    analysis = process_user_profile({
+                        'name': name.strip(),
+                        'occupation': occupation if occupation != "Select your occupation..." else '',
+                        'age': age,
+                        'interests': interests
+                    }, social_links)
                 else:
-                    st.error("❌ Failed to update profile.")
+                    analysis = None
+                
+                # Analyze and save on the shared loop without waiting; main() polls
+                # the returned future and applies the result once it has finished
+                st.session_state.pending_profile_save = asyncio.run_coroutine_threadsafe(
+                    _persist_profile(current_user['id'], analysis, profile_updates), get_event_loop()
+                )
+                st.toast("💾 Saving your profile..." if analysis is None else "🔄 Re-analyzing your profile in the background...")
+                st.rerun()
     
     # Password change for password-based accounts
     if current_user.get('auth_type') in ['password', 'hybrid']:
@@ -357,12 +638,11 @@ def show_profile_setup():
                         else:
                             st.error(f"❌ {message}")
 
-def show_user_management():
+def show_user_management(current_user):
     st.header("👥 User Management")
     
     # Verify admin access
-    current_user = auth.get_current_user()
-    if not current_user or not admin_config.is_admin(current_user['email']):
+    if not current_user or not is_admin_email(current_user['email']):
         st.error("🚫 Access denied. Admin privileges required.")
         st.info("This page is only accessible to system administrators.")
         return
@@ -371,10 +651,21 @@ def show_user_management():
     st.success(f"👋 Admin access granted for {current_user['name']}")
     st.info("🔧 **Admin View**: This page shows all users for management purposes.")
     
-    # Show all users
-    users = db.get_all_users()
-    if users:
+    # Show all users, one page at a time
+    user_count = _cached_user_count()
+    if user_count:
+        # One grouped query for every user's conversation count instead of one per expander
+        conv_counts = _cached_conv_counts()
         st.subheader("Registered Users")
+        
+        # Only fetch and render one page of expanders; their bodies run even when collapsed
+        page_count = (user_count + _USERS_PER_PAGE - 1) // _USERS_PER_PAGE
+        page = 1
+        if page_count > 1:
+            page = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, value=1, step=1)
+        start = (page - 1) * _USERS_PER_PAGE
+        users = _cached_users_page(start, _USERS_PER_PAGE)
+        st.caption(f"Showing users {start + 1}-{start + len(users)} of {user_count}")
         for user in users:
             # Handle missing keys gracefully
             user_name = user.get('name', 'Unknown User')
@@ -401,7 +692,7 @@ def show_user_management():
                         st.image(user['picture'], width=80)
                     
                     # Conversation count
-                    conv_count = db.get_user_conversation_count(user['id'])
+                    conv_count = conv_counts.get(user['id'], 0)
                     st.metric("💬 Total Conversations", conv_count)
                 
                 # Show user details with safe key access
@@ -425,12 +716,12 @@ def show_user_management():
                     if isinstance(user_context, dict):
                         if 'profile_analysis' in user_context:
                             st.write("🔍 **Profile Analysis:**")
-                            profile_text = str(user_context['profile_analysis'])
-                            st.write(profile_text[:200] + "..." if len(profile_text) > 200 else profile_text)
+                            profile_text = _context_text(user_context, 'profile_analysis')
+                            st.write(_truncate(profile_text, 200))
                         if 'social_analysis' in user_context:
                             st.write("📱 **Social Analysis:**")
-                            social_text = str(user_context['social_analysis'])
-                            st.write(social_text[:200] + "..." if len(social_text) > 200 else social_text)
+                            social_text = _context_text(user_context, 'social_analysis')
+                            st.write(_truncate(social_text, 200))
                     else:
                         st.write("Context available but not in expected format")
                 
@@ -441,6 +732,11 @@ def show_user_management():
                 with col_a:
                     if st.button(f"Delete User", key=f"delete_{user['id']}", type="secondary"):
                         if db.delete_user(user['id']):
+                            _cached_user_count.clear()
+                            _cached_users_page.clear()
+                            _cached_system_stats.clear()
+                            _cached_conv_counts.clear()  # the admin table below reloads it
+                            _cached_conv_count.clear(user['id'])
                             st.success(f"Deleted user {user_name}")
                             st.rerun()
                         else:
@@ -449,13 +745,17 @@ def show_user_management():
                 with col_b:
                     # Show button to view full context
                     if user_context:
+                        # The context section below is drawn later in this same run
                         if st.button(f"View Full Context", key=f"context_{user['id']}"):
-                            st.session_state[f"show_context_{user['id']}"] = True
-                            st.rerun()
+                            st.session_state.open_context_user_id = user['id']
         
-        # Show full context outside of expanders if requested
-        for user in users:
-            if st.session_state.get(f"show_context_{user['id']}", False):
+        # Show full context outside of expanders if requested; only that user's row is loaded
+        open_context_user_id = st.session_state.get('open_context_user_id')
+        user = db.get_user_profile(open_context_user_id) if open_context_user_id is not None else None
+        if user:
+            # Drawn in a placeholder so Hide Context can clear it without rerunning the page
+            context_slot = st.empty()
+            with context_slot.container():
                 st.markdown("---")
                 st.subheader(f"Full Context for {user.get('name', 'Unknown User')}")
                 
@@ -474,24 +774,48 @@ def show_user_management():
                     st.write("Context not in expected format")
                 
                 if st.button(f"Hide Context", key=f"hide_context_{user['id']}"):
-                    st.session_state[f"show_context_{user['id']}"] = False
-                    st.rerun()
+                    st.session_state.open_context_user_id = None
+                    context_slot.empty()
     else:
         st.info("No users registered yet.")
 
+@st.fragment(run_every=2)
+def watch_profile_save():
+    """Show that a profile save is running and rerun the app once it has finished."""
+    pending_save = st.session_state.pending_profile_save
+    if pending_save is None or pending_save.done():
+        st.rerun()
+    st.info("🔄 Re-analyzing and saving your profile in the background...")
+
+async def _persist_profile(user_id, analysis, profile_updates):
+    """Await the profile analysis coroutine (if any), attach it and save; runs on the shared loop."""
+    social_analysis = None
+    if analysis is not None:
+        try:
+            result = await analysis
+        except Exception as e:
+            # Still save the edited fields; the old analysis is kept
+            print(f"Error re-analyzing profile: {e}")
+            result = None
+        if result is not None:
+            # UserAgent.process already returns a UserContext of plain strings
+            profile_updates['user_context'] = result
+            if profile_updates.get('social_links'):
+                social_analysis = result['social_analysis']
+    return await asyncio.to_thread(db.update_user_profile, user_id, profile_updates), social_analysis
+
 async def process_user_profile(user_profile, social_links):
     # Process with user agent
-    result = await user_agent.process({
+    result = await get_user_agent().process({
         "user_profile": user_profile,
         "social_links": social_links
     })
     return result
 
-def show_my_account():
+def show_my_account(current_user):
     st.header("👤 My Account")
     
-    # Get current user
-    current_user = auth.get_current_user()
+    # Require the user main() already loaded
     if not current_user:
         st.error("User not found!")
         return
@@ -513,7 +837,7 @@ def show_my_account():
         st.markdown(f"**Last login:** {current_user.get('last_login', 'Unknown')}")
         
         # Show conversation count
-        conv_count = db.get_user_conversation_count(current_user['id'])
+        conv_count = _cached_conv_count(current_user['id'])
         st.markdown(f"**Total conversations:** {conv_count}")
     
     st.markdown("---")
@@ -548,129 +872,15 @@ def show_my_account():
         if isinstance(user_context, dict):
             if 'profile_analysis' in user_context:
                 with st.expander("📋 Profile Analysis"):
-                    profile_text = str(user_context['profile_analysis'])
-                    st.write(profile_text[:500] + "..." if len(profile_text) > 500 else profile_text)
+                    profile_text = _context_text(user_context, 'profile_analysis')
+                    st.write(_truncate(profile_text, 500))
             
             if 'social_analysis' in user_context:
                 with st.expander("📱 Social Media Analysis"):
-                    social_text = str(user_context['social_analysis'])
-                    st.write(social_text[:500] + "..." if len(social_text) > 500 else social_text)
-    
-    # Recent Conversations
-    st.subheader("💬 Recent Chat Sessions")
-    
-    # Add refresh button
-    col_refresh, col_info = st.columns([1, 4])
-    with col_refresh:
-        if st.button("🔄 Refresh", help="Refresh chat sessions from database"):
-            st.session_state.cached_session_conversations = db.get_user_conversations_by_session(current_user['id'], limit=5)
-            st.session_state.cached_user_id = current_user['id']
-            st.rerun()
-    
-    with col_info:
-        if st.session_state.cached_session_conversations is not None:
-            st.caption("💡 Chat sessions are cached for better performance. Use refresh if needed.")
-    
-    # Check if we need to load session conversations from database
-    if (st.session_state.cached_session_conversations is None or 
-        st.session_state.cached_user_id != current_user['id']):
-        # Load session conversations from database only once per session
-        st.session_state.cached_session_conversations = db.get_user_conversations_by_session(current_user['id'], limit=5)
-        st.session_state.cached_user_id = current_user['id']
-    
-    session_conversations = st.session_state.cached_session_conversations
+                    social_text = _context_text(user_context, 'social_analysis')
+                    st.write(_truncate(social_text, 500))
     
-    if session_conversations:
-        for i, session in enumerate(session_conversations, 1):
-            # Create session header with metrics
-            session_date = session['session_date']
-            conv_count = session['conversation_count']
-            avg_score = session['avg_satisfaction']
-            
-            # Determine session quality emoji
-            if avg_score >= 8.0:
-                quality_emoji = "🌟"
-            elif avg_score >= 6.0:
-                quality_emoji = "😊"
-            elif avg_score >= 4.0:
-                quality_emoji = "😐"
-            else:
-                quality_emoji = "😕"
-            
-            # Session duration calculation
-            session_start = session['session_start']
-            session_end = session['session_end']
-            
-            with st.expander(f"{quality_emoji} Session {i} - {session_date} ({conv_count} chats, Score: {avg_score}/10)"):
-                # Session overview
-                col_stats1, col_stats2, col_stats3 = st.columns(3)
-                
-                with col_stats1:
-                    st.metric("💬 Total Chats", conv_count)
-                
-                with col_stats2:
-                    st.metric("⭐ Avg Score", f"{avg_score}/10")
-                
-                with col_stats3:
-                    if session_start and session_end:
-                        st.metric("⏰ Session Time", f"{session_start.split()[1][:5]} - {session_end.split()[1][:5]}")
-                
-                st.markdown("---")
-                
-                # Show conversations with smart truncation
-                conversation_pairs = session['conversation_pairs']
-                is_long = session['is_long_session']
-                
-                if is_long and len(conversation_pairs) > 3:
-                    # Show first 2 and last 1 conversations for long sessions
-                    st.markdown("**🔹 First conversations:**")
-                    for j, pair in enumerate(conversation_pairs[:2], 1):
-                        with st.container():
-                            st.markdown(f"**Chat {j}:**")
-                            st.markdown(f"**You:** {pair['message'][:200]}{'...' if len(pair['message']) > 200 else ''}")
-                            st.markdown(f"**Hana-chan:** {pair['response'][:200]}{'...' if len(pair['response']) > 200 else ''}")
-                            st.markdown("")
-                    
-                    # Show middle conversation count
-                    middle_count = len(conversation_pairs) - 3
-                    if middle_count > 0:
-                        st.markdown(f"**📋 ... {middle_count} more conversations in this session ...**")
-                        st.markdown("")
-                    
-                    # Show last conversation
-                    if len(conversation_pairs) > 2:
-                        st.markdown("**🔹 Latest conversation:**")
-                        last_pair = conversation_pairs[-1]
-                        st.markdown(f"**You:** {last_pair['message'][:200]}{'...' if len(last_pair['message']) > 200 else ''}")
-                        st.markdown(f"**Hana-chan:** {last_pair['response'][:200]}{'...' if len(last_pair['response']) > 200 else ''}")
-                    
-                    # Show full session option
-                    if st.button(f"📖 Show All {conv_count} Conversations", key=f"show_all_{i}"):
-                        st.markdown("**🔹 Complete Session:**")
-                        for j, pair in enumerate(conversation_pairs, 1):
-                            with st.container():
-                                st.markdown(f"**Chat {j}:**")
-                                st.markdown(f"**You:** {pair['message']}")
-                                st.markdown(f"**Hana-chan:** {pair['response']}")
-                                if j < len(conversation_pairs):
-                                    st.markdown("---")
-                else:
-                    # Show all conversations for shorter sessions
-                    st.markdown("**🔹 Complete Session:**")
-                    for j, pair in enumerate(conversation_pairs, 1):
-                        with st.container():
-                            st.markdown(f"**Chat {j}:**")
-                            st.markdown(f"**You:** {pair['message']}")
-                            st.markdown(f"**Hana-chan:** {pair['response']}")
-                            if j < len(conversation_pairs):
-                                st.markdown("---")
-                
-                # Session summary
-                if session['total_characters'] > 0:
-                    st.markdown("---")
-                    st.caption(f"📊 Session stats: {session['total_characters']} characters total")
-    else:
-        st.info("No chat sessions yet. Start chatting with Hana-chan!")
+    _recent_sessions(current_user)
     
     # Sentiment Analysis Summary
     st.subheader("📊 Emotional Insights & Daily Summary")
@@ -679,20 +889,15 @@ def show_my_account():
     col_refresh_sent, col_info_sent = st.columns([1, 4])
     with col_refresh_sent:
         if st.button("🔄 Refresh Insights", help="Refresh emotional insights from database"):
-            st.session_state.cached_daily_summaries = None
-            st.session_state.cached_recent_sentiment = None
-            st.rerun()
+            # The insights below are loaded after this in the same run; only this user's entries
+            _cached_daily_summary.clear(current_user['id'])
+            _cached_recent_sentiment.clear(current_user['id'])
     
     with col_info_sent:
-        if st.session_state.cached_daily_summaries is not None:
-            st.caption("📊 Emotional insights are cached for better performance.")
-    
-    # Load daily sentiment summaries (cached)
-    if (st.session_state.cached_daily_summaries is None or 
-        st.session_state.cached_user_id != current_user['id']):
-        st.session_state.cached_daily_summaries = db.get_daily_sentiment_summary(current_user['id'], days=7)
+        st.caption("📊 Emotional insights are cached for better performance.")
     
-    daily_summaries = st.session_state.cached_daily_summaries
+    # Load daily sentiment summaries (cached per user; cleared when a new analysis is saved)
+    daily_summaries = _cached_daily_summary(current_user['id'])
     
     if daily_summaries:
         st.markdown("**📈 Your Week at a Glance:**")
@@ -700,10 +905,14 @@ def show_my_account():
         # Create columns for metrics
         col1, col2, col3 = st.columns(3)
         
-        # Calculate weekly averages
-        week_sentiment = sum(day['avg_sentiment'] for day in daily_summaries) / len(daily_summaries)
-        week_engagement = sum(day['avg_engagement'] for day in daily_summaries) / len(daily_summaries)
-        total_conversations = sum(day['conversation_count'] for day in daily_summaries)
+        # Calculate weekly averages in one pass over the days
+        sentiment_total = engagement_total = total_conversations = 0
+        for day in daily_summaries:
+            sentiment_total += day['avg_sentiment']
+            engagement_total += day['avg_engagement']
+            total_conversations += day['conversation_count']
+        week_sentiment = sentiment_total / len(daily_summaries)
+        week_engagement = engagement_total / len(daily_summaries)
         
         with col1:
             sentiment_emoji = "😊" if week_sentiment > 0.7 else "😐" if week_sentiment > 0.4 else "😔"
@@ -716,36 +925,37 @@ def show_my_account():
         with col3:
             st.metric("Total Chats", f"💬 {total_conversations}")
         
-        # Daily breakdown
+        # Daily breakdown: the data is read-only, so every day is rendered as one
+        # <details> block in a single element instead of an expander of widgets per day.
+        # The summaries are LLM-generated, so all values are escaped.
         st.markdown("**📅 Daily Breakdown:**")
+        blocks = []
         for day in daily_summaries:
-            with st.expander(f"{day['date']} - {day['conversation_count']} conversations"):
-                col_a, col_b = st.columns(2)
-                
-                with col_a:
-                    mood_emoji = "😊" if day['avg_sentiment'] > 0.7 else "😐" if day['avg_sentiment'] > 0.4 else "😔"
-                    st.metric("Daily Mood", f"{mood_emoji} {day['avg_sentiment']}/1.0")
-                
-                with col_b:
-                    energy_emoji = "⚡" if day['avg_engagement'] > 0.7 else "👍" if day['avg_engagement'] > 0.4 else "😴"
-                    st.metric("Energy Level", f"{energy_emoji} {day['avg_engagement']}/1.0")
-                
-                st.markdown("**Daily Summary:**")
-                # Split long summaries and show key points
-                summary_parts = day['daily_summary'].split(' | ')
-                for part in summary_parts[:3]:  # Show first 3 summaries
-                    if part.strip():
-                        st.write(f"• {part.strip()}")
-                
-                if len(summary_parts) > 3:
-                    st.write(f"• ... and {len(summary_parts) - 3} more conversations")
+            mood_emoji = "😊" if day['avg_sentiment'] > 0.7 else "😐" if day['avg_sentiment'] > 0.4 else "😔"
+            energy_emoji = "⚡" if day['avg_engagement'] > 0.7 else "👍" if day['avg_engagement'] > 0.4 else "😴"
+            
+            # Split long summaries and show the first 3 key points, skipping blank parts
+            summary_parts = day['daily_summary'].split(' | ')
+            bullets = []
+            for part in summary_parts[:3]:
+                if part.strip():
+                    bullets.append(f"<li>{html.escape(part.strip())}</li>")
+            if len(summary_parts) > 3:
+                bullets.append(f"<li>... and {len(summary_parts) - 3} more conversations</li>")
+            
+            blocks.append(_DAILY_BREAKDOWN_TMPL.format(
+                date=html.escape(str(day['date'])),
+                count=html.escape(str(day['conversation_count'])),
+                mood_emoji=mood_emoji,
+                mood=html.escape(str(day['avg_sentiment'])),
+                energy_emoji=energy_emoji,
+                energy=html.escape(str(day['avg_engagement'])),
+                bullets="".join(bullets)
+            ))
+        st.markdown("\n".join(blocks), unsafe_allow_html=True)
     
     # Recent Emotional Analysis
-    if (st.session_state.cached_recent_sentiment is None or 
-        st.session_state.cached_user_id != current_user['id']):
-        st.session_state.cached_recent_sentiment = db.get_recent_sentiment_analysis(current_user['id'], limit=3)
-    
-    recent_sentiment = st.session_state.cached_recent_sentiment
+    recent_sentiment = _cached_recent_sentiment(current_user['id'])
     
     if recent_sentiment:
         st.markdown("**🎭 Recent Emotional Patterns:**")
@@ -798,12 +1008,99 @@ def show_my_account():
         if st.button("Analyze Social Media", use_container_width=True):
             st.info("Go to 'Social Media Analysis' page for insights")
 
-def show_admin_panel():
+@st.fragment
+def _recent_sessions(current_user):
+    """Recent chat sessions; their Refresh and Show All buttons rerun only this section"""
+    # Recent Conversations
+    st.subheader("💬 Recent Chat Sessions")
+    
+    # Cached per user; the cheap latest-id probe picks up newly saved chats
+    latest_id = db.get_latest_conversation_id(current_user['id'])
+    
+    # Add refresh button
+    col_refresh, col_info = st.columns([1, 4])
+    with col_refresh:
+        if st.button("🔄 Refresh", help="Refresh chat sessions from database"):
+            # Drop only the entry loaded below in this same run, not other users' sessions
+            _cached_session_conversations.clear(current_user['id'], 5, latest_id)
+    
+    with col_info:
+        st.caption("💡 Chat sessions are cached for better performance. Use refresh if needed.")
+    
+    session_conversations = _cached_session_conversations(current_user['id'], 5, latest_id)
+    
+    if session_conversations:
+        for i, session in enumerate(session_conversations, 1):
+            # Create session header with metrics
+            session_date = session['session_date']
+            conv_count = session['conversation_count']
+            avg_score = session['avg_satisfaction']
+            
+            # Determine session quality emoji
+            if avg_score >= 8.0:
+                quality_emoji = "🌟"
+            elif avg_score >= 6.0:
+                quality_emoji = "😊"
+            elif avg_score >= 4.0:
+                quality_emoji = "😐"
+            else:
+                quality_emoji = "😕"
+            
+            # Session duration calculation
+            session_start = session['session_start']
+            session_end = session['session_end']
+            
+            with st.expander(f"{quality_emoji} Session {i} - {session_date} ({conv_count} chats, Score: {avg_score}/10)"):
+                # Session overview
+                col_stats1, col_stats2, col_stats3 = st.columns(3)
+                
+                with col_stats1:
+                    st.metric("💬 Total Chats", conv_count)
+                
+                with col_stats2:
+                    st.metric("⭐ Avg Score", f"{avg_score}/10")
+                
+                with col_stats3:
+                    if session_start and session_end:
+                        st.metric("⏰ Session Time", f"{session_start.split()[1][:5]} - {session_end.split()[1][:5]}")
+                
+                st.markdown("---")
+                
+                # Show conversations with smart truncation
+                conversation_pairs = session['conversation_pairs']
+                is_long = session['is_long_session']
+                
+                if is_long and len(conversation_pairs) > 3:
+                    # Show first 2 and last 1 conversations for long sessions, as one block
+                    last_pair = conversation_pairs[-1]
+                    st.markdown("\n\n".join([
+                        "**🔹 First conversations:**",
+                        _chat_pairs_markdown(conversation_pairs[:2], limit=200),
+                        f"**📋 ... {len(conversation_pairs) - 3} more conversations in this session ...**",
+                        "**🔹 Latest conversation:**",
+                        f"**You:** {_truncate(last_pair['message'], 200)}",
+                        f"**Hana-chan:** {_truncate(last_pair['response'], 200)}"
+                    ]))
+                    
+                    # Show full session option
+                    if st.button(f"📖 Show All {conv_count} Conversations", key=f"show_all_{i}"):
+                        st.markdown("**🔹 Complete Session:**\n\n" + _chat_pairs_markdown(conversation_pairs, divider=True))
+                else:
+                    # Show all conversations for shorter sessions
+                    st.markdown("**🔹 Complete Session:**\n\n" + _chat_pairs_markdown(conversation_pairs, divider=True))
+                
+                # Session summary
+                if session['total_characters'] > 0:
+                    st.markdown("---")
+                    st.caption(f"📊 Session stats: {session['total_characters']} characters total")
+    else:
+        st.info("No chat sessions yet. Start chatting with Hana-chan!")
+
+def show_admin_panel(current_user):
     st.header("⚙️ Admin Panel")
     
-    # Get current user to verify admin status
-    current_user = auth.get_current_user()
-    if not current_user or not admin_config.is_admin(current_user['email']):
+    # Verify admin access
+    if not current_user or not is_admin_email(current_user['email']):
         st.error("🚫 Access denied. Admin privileges required.")
         return
     
@@ -812,15 +1109,11 @@ def show_admin_panel():
     # Admin Statistics
     st.subheader("📊 System Statistics")
     
-    # Get system stats
-    all_users = db.get_all_users()
-    total_users = len(all_users)
-    admin_users = admin_config.get_active_admins()
-    
-    # Calculate total conversations
-    total_conversations = 0
-    for user in all_users:
-        total_conversations += db.get_user_conversation_count(user['id'])
+    # Get system stats (cached; widget clicks on this page don't re-query them)
+    stats = _cached_system_stats()
+    total_users = stats['total_users']
+    total_conversations = stats['total_conversations']
+    admin_count = len(_admin_emails())
     
     # Display metrics
     col1, col2, col3, col4 = st.columns(4)
@@ -828,7 +1121,7 @@ def show_admin_panel():
     with col1:
         st.metric("Total Users", total_users)
     with col2:
-        st.metric("Admin Users", len(admin_users))
+        st.metric("Admin Users", admin_count)
     with col3:
         st.metric("Total Conversations", total_conversations)
     with col4:
@@ -842,7 +1135,7 @@ def show_admin_panel():
     
     # Current Admins
     st.markdown("**Current Admins:**")
-    admins = admin_config.get_all_admins()
+    admins = _cached_admin_list()
     
     for admin in admins:
         col1, col2, col3, col4 = st.columns([2, 2, 2, 1])
@@ -858,6 +1151,8 @@ def show_admin_panel():
             if admin['is_active'] and admin['email'] != current_user['email']:
                 if st.button("Remove", key=f"remove_admin_{admin['email']}", type="secondary"):
                     if admin_config.remove_admin(admin['email']):
+                        _admin_emails.clear()
+                        _cached_admin_list.clear()
                         st.success(f"Removed admin privileges from {admin['email']}")
                         st.rerun()
                     else:
@@ -873,6 +1168,8 @@ def show_admin_panel():
             if not new_admin_email:
                 st.error("Please enter an email address")
             elif admin_config.add_admin(new_admin_email, current_user['email']):
+                _admin_emails.clear()
+                _cached_admin_list.clear()
                 st.success(f"Added {new_admin_email} as admin")
                 st.rerun()
             else:
@@ -884,8 +1181,9 @@ def show_admin_panel():
     st.subheader("📈 User Analysis")
     
     # Count by auth type
-    password_users = len([u for u in all_users if u.get('auth_type') == 'password'])
-    google_users = len([u for u in all_users if u.get('auth_type') == 'google'])
+    auth_type_counts = stats['auth_type_counts']
+    password_users = auth_type_counts.get('password', 0)
+    google_users = auth_type_counts.get('google', 0)
     
     col1, col2 = st.columns(2)
     
@@ -895,7 +1193,7 @@ def show_admin_panel():
     
     with col2:
         # Recent user registrations
-        recent_users = sorted(all_users, key=lambda x: x.get('created_at', ''), reverse=True)[:5]
+        recent_users = stats['recent_users']
         st.markdown("**Recent Registrations:**")
         for user in recent_users:
             st.write(f"• {user['name']} ({user.get('auth_type', 'unknown')}) - {user.get('created_at', 'Unknown')}")
@@ -913,17 +1211,16 @@ def show_admin_panel():
     with col2:
         if st.button("System Health Check", use_container_width=True):
             st.success("✅ System is running normally")
-            st.info(f"Database: Connected\nAdmin users: {len(admin_users)}\nTotal users: {total_users}")
+            st.info(f"Database: Connected\nAdmin users: {admin_count}\nTotal users: {total_users}")
     
     with col3:
         if st.button("View System Logs", use_container_width=True):
             st.info("Feature coming soon: System logs viewer")
 
-def show_chat():
+def show_chat(current_user):
     st.header("💬 Hana Chat")
     
-    # Get current authenticated user
-    current_user = auth.get_current_user()
+    # Require the user main() already loaded
     if not current_user:
         st.error("User not found!")
         return
@@ -936,14 +1233,8 @@ def show_chat():
     
     # Load user's conversation history
     if not st.session_state.conversation_history:
-        # Load conversation history from database
-        conversations = db.get_user_conversations(current_user['id'], limit=20)
-        chat_history = []
-        for conv in conversations:
-            chat_history.append({"role": "user", "content": conv['message']})
-            chat_history.append({"role": "assistant", "content": conv['response']})
-        # Conversations are now in correct chronological order (oldest first)
-        st.session_state.conversation_history = chat_history
+        # Load conversation history (memoized per user; cache_data hands back a copy)
+        st.session_state.conversation_history = load_recent_history(current_user['id'])
     
     # Load user context
     if not st.session_state.user_context and current_user.get('user_context'):
@@ -951,159 +1242,95 @@ def show_chat():
     
     user_name = current_user['name']
     
-    # Social media style chat header
-    st.markdown(f"""
-    <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); 
-                color: white; padding: 20px; border-radius: 15px; margin-bottom: 20px; text-align: center;">
-        <h2>💬 Chat with Hana-chan</h2>
-        <p>Hey {user_name}! 👋 Let's have a conversation!</p>
-    </div>
-    """, unsafe_allow_html=True)
+    # Social media style chat header (the name is user-supplied, so escape it)
+    st.markdown(_CHAT_HEADER_TMPL.format(name=html.escape(user_name)), unsafe_allow_html=True)
     
+    _chat_panel(current_user)
+
+@st.fragment
+def _chat_panel(current_user):
+    """Chat bubbles, input and analysis status; sending a message reruns only this part of the page"""
     # Chat container with social media styling
     chat_container = st.container()
     
     with chat_container:
-        # Display conversation history with social media styling
-        for i, message in enumerate(st.session_state.conversation_history):
-            if message["role"] == "user":
-                # User message - right aligned, blue bubble
-                st.markdown(f"""
-                <div style="display: flex; justify-content: flex-end; margin: 10px 0;">
-                    <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); 
-                                color: white; padding: 12px 16px; border-radius: 18px; 
-                                max-width: 70%; word-wrap: break-word; box-shadow: 0 2px 8px rgba(0,0,0,0.1);">
-                        {message['content']}
-                    </div>
-                </div>
-                """, unsafe_allow_html=True)
-            else:
-                # AI message - left aligned, gray bubble
-                st.markdown(f"""
-                <div style="display: flex; justify-content: flex-start; margin: 10px 0;">
-                    <div style="background: #f0f2f5; color: #1c1e21; padding: 12px 16px; 
-                                border-radius: 18px; max-width: 70%; word-wrap: break-word; 
-                                box-shadow: 0 2px 8px rgba(0,0,0,0.1);">
-                        <strong>🌸 Hana-chan:</strong> {message['content']}
-                    </div>
-                </div>
-                """, unsafe_allow_html=True)
-    
-    # Show typing indicator if loading
-    if st.session_state.chat_loading:
-        st.markdown("""
-        <div style="display: flex; justify-content: flex-start; margin: 10px 0;">
-            <div style="background: #f0f2f5; color: #1c1e21; padding: 12px 16px; 
-                        border-radius: 18px; box-shadow: 0 2px 8px rgba(0,0,0,0.1); 
-                        display: flex; align-items: center;">
-                <strong>🌸 Hana-chan:</strong>
-                <div style="margin-left: 10px; display: flex; align-items: center;">
-                    <div class="typing-indicator">
-                        <div class="typing-circle"></div>
-                        <div class="typing-circle"></div>
-                        <div class="typing-circle"></div>
-                    </div>
-                </div>
-            </div>
-        </div>
-        
-        <style>
-        .typing-indicator {
-            display: flex;
-            align-items: center;
-            gap: 4px;
-        }
-        
-        .typing-circle {
-            width: 8px;
-            height: 8px;
-            border-radius: 50%;
-            background-color: #999;
-            animation: typing 1.4s ease-in-out infinite;
-        }
-        
-        .typing-circle:nth-child(1) {
-            animation-delay: 0ms;
-        }
-        
-        .typing-circle:nth-child(2) {
-            animation-delay: 200ms;
-        }
-        
-        .typing-circle:nth-child(3) {
-            animation-delay: 400ms;
-        }
-        
-        @keyframes typing {
-            0%, 60%, 100% {
-                transform: translateY(0);
-                opacity: 0.4;
-            }
-            30% {
-                transform: translateY(-10px);
-                opacity: 1;
-            }
-        }
-        </style>
-        """, unsafe_allow_html=True)
-    
-    # Chat input with social media styling
-    st.markdown("---")
-    
-    # Initialize message counter if not exists
-    if 'message_counter' not in st.session_state:
-        st.session_state.message_counter = 0
-    
-    # Input area with dynamic key to force refresh
-    col1, col2 = st.columns([4, 1])
-    
-    with col1:
-        user_input = st.text_input(
-            "💬 Type your message...",
-            placeholder="What's on your mind?",
-            key=f"chat_input_{st.session_state.message_counter}",
-            label_visibility="collapsed"
+        # Display the most recent conversation history with native chat bubbles
+        for message in st.session_state.conversation_history[-_CHAT_RENDER_LIMIT:]:
+            with st.chat_message(message["role"], avatar="🌸" if message["role"] == "assistant" else None):
+                st.markdown(message["content"])
+    
+    # Chat input (clears itself after each send, so no per-message widget keys)
+    user_input = st.chat_input("What's on your mind?")
+    
+    # Handle message sending in this run: the submit already triggered a rerun, so
+    # render the new turn in place instead of queueing it and rerunning again
+    if user_input:
+        # The agent keeps its own short window of this user's turns, so only the new
+        # message is passed; the display history just seeds it on the first turn
+        chatbot_agent = get_chatbot_agent()
+        chat_input = chatbot_agent.begin_turn(
+            current_user['id'],
+            user_input,
+            st.session_state.user_context or {},
+            _chat_profile(current_user),
+            seed_history=_history_window(st.session_state.conversation_history)
         )
-    
-    with col2:
-        send_button = st.button("Send", use_container_width=True, type="primary")
-    
-    # Handle message sending
-    if send_button and user_input:
-        # Increment counter to create new input field
-        st.session_state.message_counter += 1
         
         # Add user message to conversation history immediately
         st.session_state.conversation_history.append({"role": "user", "content": user_input})
         
-        # Set loading state and rerun to show typing indicator
-        st.session_state.chat_loading = True
-        st.session_state.pending_message = user_input
-        st.rerun()
-    
-    # Process pending message if there is one
-    if st.session_state.get('pending_message') and st.session_state.chat_loading:
-        message = st.session_state.pending_message
-        # Clear the pending message
-        st.session_state.pending_message = None
-        
-        # Process message
-        asyncio.run(process_message_async(message))
-        
-        # Clear loading state
-        st.session_state.chat_loading = False
-        
-        # Rerun to update the chat with the response
-        st.rerun()
-    
-    # Show conversation analysis status (non-blocking)
-    if st.session_state.last_analysis_time:
-        time_since = time.time() - st.session_state.last_analysis_time
-        if time_since < 300:  # Show for 5 minutes after analysis
-            st.info(f"📊 Conversation analysis completed {int(time_since)}s ago")
+        with chat_container:
+            with st.chat_message("user"):
+                st.markdown(user_input)
+            
+            # Stream the reply into the chat as tokens arrive instead of waiting for all of it
+            try:
+                with st.chat_message("assistant", avatar="🌸"):
+                    # Repeated short messages ("hi", "thanks") reuse the earlier reply
+                    response = chatbot_agent.cached_reply(chat_input)
+                    if response is not None:
+                        st.markdown(response)
+                    else:
+                        typing = st.empty()
+                        typing.markdown(_TYPING_INDICATOR_HTML, unsafe_allow_html=True)
+                        reply = st.empty()
+                        try:
+                            with reply:
+                                streamed = st.write_stream(_clear_on_first(typing, iter_async(
+                                    chatbot_agent.process_stream(chat_input)
+                                )))
+                        finally:
+                            # An empty or failed stream never reaches _clear_on_first's first chunk
+                            typing.empty()
+                        if not streamed or not streamed.strip():
+                            raise RuntimeError("No reply was generated, please try again")
+                        # Show exactly what is saved: the length limit may trim the streamed tail
+                        response = chatbot_agent.finalize_response(streamed, user_input)
+                        if response != streamed:
+                            reply.markdown(response)
+                        chatbot_agent.remember_reply(chat_input, response)
+                chatbot_agent.end_turn(current_user['id'], user_input, response)
+                save_chat_reply(current_user, user_input, response)
+            except Exception as e:
+                # Roll the turn back: nothing was saved or added to the agent's window, so
+                # drop the unanswered message from the display history too
+                history = st.session_state.conversation_history
+                if history and history[-1] == {"role": "user", "content": user_input}:
+                    history.pop()
+                st.error(f"Error processing message: {str(e)}")
+    
+    # A send reruns only this fragment, so pick up a finished analysis here too
+    apply_conversation_analysis()
+    
+    # Show conversation analysis status (non-blocking) for 5 minutes after analysis
+    last_analysis_time = st.session_state.last_analysis_time
+    time_since = time.time() - last_analysis_time if last_analysis_time else None
+    analysis_fresh = time_since is not None and time_since < 300
+    if analysis_fresh:
+        st.info(f"📊 Conversation analysis completed {int(time_since)}s ago")
     
     # Show analysis results in expander (not always visible)
-    if st.session_state.satisfaction_metrics and st.session_state.last_analysis_time and time.time() - st.session_state.last_analysis_time < 300:
+    if analysis_fresh and st.session_state.satisfaction_metrics:
         with st.expander("📊 Recent Conversation Analysis"):
             metrics = st.session_state.satisfaction_metrics
             if isinstance(metrics, dict):
@@ -1120,110 +1347,116 @@ def show_chat():
                     for rec in metrics["recommendations"][:3]:  # Show only top 3
                         st.markdown(f"• {rec}")
 
-async def process_message_async(message):
-    """Process message asynchronously without blocking the UI"""
+_HISTORY_WINDOW_MESSAGES = 20  # 10 user + 10 assistant turns
+_HISTORY_WINDOW_CHARS = 8000
+
+def _history_window(history):
+    """The last turns of a conversation, dropping the oldest until their text fits the size cap"""
+    window = history[-_HISTORY_WINDOW_MESSAGES:]
+    total = sum(len(msg["content"]) for msg in window)
+    start = 0
+    while total > _HISTORY_WINDOW_CHARS and start < len(window) - 1:
+        total -= len(window[start]["content"])
+        start += 1
+    return window[start:]
+
+def _chat_profile(current_user):
+    """User profile fields the chatbot personalizes its replies with"""
+    return {
+        "name": current_user.get('name', ''),
+        "age": current_user.get('age', ''),
+        "occupation": current_user.get('occupation', ''),
+        "interests": current_user.get('interests', ''),
+        "auth_type": current_user.get('auth_type', '')
+    }
+
+def save_chat_reply(current_user, message, response):
+    """Record a streamed reply: save it and start background analysis without blocking the UI"""
     try:
-        # Get current user for saving to database
-        current_user = auth.get_current_user()
-        if not current_user:
-            st.error("User not authenticated!")
-            return
-        
-        # Process with chatbot agent
-        response = await chatbot_agent.process({
-            "message": message,
-            "context": st.session_state.user_context or {},
-            "history": st.session_state.conversation_history,
-            "user_profile": {
-                "name": current_user.get('name', ''),
-                "age": current_user.get('age', ''),
-                "occupation": current_user.get('occupation', ''),
-                "interests": current_user.get('interests', ''),
-                "auth_type": current_user.get('auth_type', '')
-            }
-        })
-        
         # Update conversation history with just the assistant response
         st.session_state.conversation_history.append({"role": "assistant", "content": response})
         
         # Save conversation to database immediately
-        conversation_id = None
-        if current_user:
-            conversation_id = db.save_conversation(
-                user_id=current_user['id'],
-                message=message,
-                response=response,
-                satisfaction_score=0.8  # Default score, will be updated by background analysis
-            )
+        conversation_id = db.save_conversation(
+            user_id=current_user['id'],
+            message=message,
+            response=response,
+            satisfaction_score=0.8  # Default score, will be updated by background analysis
+        )
+        # Only this user's cached history and count are stale; the admin-wide counts
+        # refresh on their own 30s TTL rather than being dropped on every message
+        load_recent_history.clear(current_user['id'])
+        _cached_conv_count.clear(current_user['id'])
         
-        # Start background analysis (non-blocking) with conversation ID
-        asyncio.create_task(background_conversation_analysis(current_user['id'], conversation_id))
+        # Queue background analysis on the shared loop (non-blocking); the next rerun
+        # picks up the result in apply_conversation_analysis()
+        st.session_state.metrics_task = queue_conversation_analysis(
+            user_id=current_user['id'],
+            conversation_id=conversation_id,
+            conversation=_history_window(st.session_state.conversation_history),
+            user_context=st.session_state.user_context or {}
+        )
         
     except Exception as e:
         st.error(f"Error processing message: {str(e)}")
 
-async def background_conversation_analysis(user_id, conversation_id):
-    """Run conversation analysis in the background"""
+async def background_conversation_analysis(user_id, conversation_id, conversation, user_context):
+    """Run conversation analysis in the background; returns the result (or None on error)"""
     try:
         # Wait a bit to avoid overwhelming the system
         await asyncio.sleep(2)
         
         # Process with management agent (includes sentiment analysis now)
-        result = await management_agent.process({
-            "conversation": st.session_state.conversation_history,
-            "user_context": st.session_state.user_context or {}
+        result = await get_management_agent().process({
+            "conversation": conversation,
+            "user_context": user_context
         })
         
-        # Update session state with all analysis results
-        st.session_state.satisfaction_metrics = result
-        st.session_state.last_analysis_time = time.time()
-        
         # Save sentiment analysis to database if we have the data
+        # (in a worker thread: a blocking write here would stall streaming replies on the loop)
         if conversation_id and "sentiment_analysis" in result:
-            db.save_sentiment_analysis(
+            await asyncio.to_thread(
+                db.save_sentiment_analysis,
                 user_id=user_id,
                 conversation_id=conversation_id,
                 sentiment_data=result["sentiment_analysis"]
             )
+            # Per-user clears (safe off the script thread); this user's tabs pick up the new
+            # analysis while other users' cached insights are kept
+            _cached_daily_summary.clear(user_id)
+            _cached_recent_sentiment.clear(user_id)
         
-        # Refresh cached conversations if this user's cache exists
-        if (st.session_state.cached_user_id == user_id and 
-            st.session_state.cached_session_conversations is not None):
-            # Update the cached conversations with the latest data
-            st.session_state.cached_session_conversations = db.get_user_conversations_by_session(user_id, limit=5)
-        
-        # Refresh cached sentiment data if this user's cache exists
-        if (st.session_state.cached_user_id == user_id and 
-            (st.session_state.cached_daily_summaries is not None or 
-             st.session_state.cached_recent_sentiment is not None)):
-            # Update sentiment caches with the latest data
-            st.session_state.cached_daily_summaries = db.get_daily_sentiment_summary(user_id, days=7)
-            st.session_state.cached_recent_sentiment = db.get_recent_sentiment_analysis(user_id, limit=3)
+        return result
         
     except Exception as e:
         # Silently handle errors in background task
         print(f"Background analysis error: {str(e)}")
-        pass
+        return None
+
+def apply_conversation_analysis():
+    """Move a finished background analysis into session state (runs on the script thread)"""
+    if st.session_state.metrics_task is None:
+        return
+    future = st.session_state.metrics_task
+    if not future.done():
+        return
+    st.session_state.metrics_task = None
+    
+    result = future.result()
+    if not result:
+        return
+    
+    # Update session state with all analysis results
+    st.session_state.satisfaction_metrics = result
+    st.session_state.last_analysis_time = time.time()
 
 def show_social_media_analysis():
     st.header("📱 Social Media URL Analysis")
     st.markdown("**AI-Powered URL Analysis for Instagram, Twitter/X, Threads & More**")
     st.markdown("✨ *Now with full Threads support! Analyze profiles, posts, and replies from Meta's new platform.*")
     
-    # Platform badges
-    col1, col2, col3, col4, col5, col6 = st.columns(6)
-    with col1:
-        st.markdown("📱 **Instagram**")
-    with col2:
-        st.markdown("🐦 **Twitter/X**")
-    with col3:
-        st.markdown("🧵 **Threads**")
-    with col4:
-        st.markdown("💼 **LinkedIn**")
-    with col5:
-        st.markdown("🎵 **TikTok**")
-    with col6:
-        st.markdown("📺 **YouTube**")
+    # Platform badges (static, one element)
+    st.markdown(_PLATFORM_BADGES_HTML, unsafe_allow_html=True)
     
     st.markdown("---")
     
@@ -1290,22 +1523,26 @@ def show_social_media_analysis():
     
     # Analysis button
     if st.button("Analyze Social Media Profiles", type="primary"):
-        urls = [url for url in [url1, url2, url3, url4] if url.strip()]
+        urls = tuple(stripped for url in (url1, url2, url3, url4) if (stripped := url.strip()))
         
         if not urls:
             st.error("Please enter at least one social media URL")
             return
         
-        # Show loading state
-        with st.spinner("🔄 Analyzing social media profiles..."):
-            st.info("Extracting insights from URL patterns and platform behavior")
+        # Show progress while the URLs are analyzed concurrently; the results render
+        # below in this same run, so no extra rerun is needed
+        with st.status(f"🔄 Analyzing {len(urls)} social media profile(s)...") as status:
+            st.write("Extracting insights from URL patterns and platform behavior")
             
             # Process URLs with user agent
-            result = asyncio.run(analyze_social_media_urls(urls))
+            result = analyze_social_media_urls(urls)
             st.session_state.social_analysis_results = result
-        
-        st.success("✅ Analysis complete!")
-        st.rerun()
+            
+            if isinstance(result, dict):
+                status.update(label=f"✅ Analysis complete: {len(result['url_analyses'])} of {len(urls)} URLs analyzed",
+                              state="complete", expanded=False)
+            else:
+                status.update(label="❌ Analysis failed", state="error")
     
     # Display results
     if st.session_state.social_analysis_results:
@@ -1328,28 +1565,35 @@ def display_social_media_results(results):
     # If results are structured, display them nicely
     if isinstance(results, dict):
         # Summary metrics
+        url_count = len(results.get('urls', []))
+        platform_count = len(set(results.get('platforms', [])))
+        success_rate = results.get('success_rate', 0)
         col1, col2, col3 = st.columns(3)
         
         with col1:
-            st.metric("URLs Analyzed", len(results.get('urls', [])))
+            st.metric("URLs Analyzed", url_count)
         with col2:
-            st.metric("Platforms Detected", len(set(results.get('platforms', []))))
+            st.metric("Platforms Detected", platform_count)
         with col3:
-            st.metric("Success Rate", f"{results.get('success_rate', 0):.1%}")
+            st.metric("Success Rate", f"{success_rate:.1%}")
         
         st.markdown("---")
         
         # Individual URL analyses
         for i, url_analysis in enumerate(results.get('url_analyses', []), 1):
-            with st.expander(f"🔗 URL #{i}: {url_analysis.get('platform', 'Unknown')} Analysis"):
+            platform = url_analysis.get('platform', 'Unknown')
+            with st.expander(f"🔗 URL #{i}: {platform} Analysis"):
                 col1, col2 = st.columns([1, 2])
                 
                 with col1:
-                    st.markdown("**📋 Basic Info**")
-                    st.write(f"**Platform:** {url_analysis.get('platform', 'Unknown')}")
-                    st.write(f"**Username:** {url_analysis.get('username', 'Not detected')}")
-                    st.write(f"**Content Type:** {url_analysis.get('content_type', 'Profile')}")
-                    st.write(f"**Activity Level:** {url_analysis.get('activity_level', 'Unknown')}")
+                    # Basic info as one markdown block
+                    st.markdown("\n\n".join([
+                        "**📋 Basic Info**",
+                        f"**Platform:** {platform}",
+                        f"**Username:** {url_analysis.get('username', 'Not detected')}",
+                        f"**Content Type:** {url_analysis.get('content_type', 'Profile')}",
+                        f"**Activity Level:** {url_analysis.get('activity_level', 'Unknown')}"
+                    ]))
                 
                 with col2:
                     st.markdown("**🎯 Insights & Analysis**")
@@ -1379,13 +1623,47 @@ def display_social_media_results(results):
     else:
         st.write(results)
 
-async def analyze_social_media_urls(urls):
-    """Analyze social media URLs using the user agent"""
+async def _analyze_urls(urls):
+    """Analyze each URL concurrently; one failing URL doesn't abort the others"""
+    user_agent = get_user_agent()
+    results = await asyncio.gather(*(user_agent.process_single(url) for url in urls), return_exceptions=True)
+    url_analyses = []
+    for url, result in zip(urls, results):
+        if isinstance(result, Exception):
+            print(f"Error analyzing {url}: {str(result)}")
+        else:
+            url_analyses.append(result)
+    return {
+        "urls": list(urls),
+        "platforms": [analysis['platform'] for analysis in url_analyses],
+        "url_analyses": url_analyses,
+        "success_rate": len(url_analyses) / len(results) if results else 0,
+        # False if any URL raised or came back as a fallback after a failed scrape/LLM call
+        "complete": len(url_analyses) == len(results) and all(a['analysis_complete'] for a in url_analyses)
+    }
+
+class _IncompleteAnalysis(Exception):
+    """Carries a partial social analysis out of _cached_social_analysis so it isn't cached."""
+    def __init__(self, result):
+        super().__init__("Social media analysis incomplete")
+        self.result = result
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _cached_social_analysis(urls_key, _urls):
+    # Keyed on the sorted URL tuple so reordering still hits; _urls keeps the user's order
+    # for display. st.cache_data doesn't store a call that raises, so partial results are
+    # raised out (and shown by the caller) instead of being cached for an hour.
+    result = run_async(_analyze_urls(_urls))
+    if not result["complete"]:
+        raise _IncompleteAnalysis(result)
+    return result
+
+def analyze_social_media_urls(urls):
+    """Analyze social media URLs using the user agent (complete results cached per URL set for an hour)"""
     try:
-        result = await user_agent.process({
-            "social_media_urls": urls
-        })
-        return result
+        return _cached_social_analysis(tuple(sorted(urls)), list(urls))
+    except _IncompleteAnalysis as e:
+        return e.result
     except Exception as e:
         return f"Error analyzing URLs: {str(e)}"
 
@@ -131,7 +131,8 @@ class SimpleAuth:
         keys_to_clear = [
             'user_id', 'user_context', 'conversation_history', 
             'satisfaction_metrics', 'social_analysis_results',
-            'authenticated', 'user_info'
+            'authenticated', 'user_info', '_cached_user',
+            'open_context_user_id'
         ]
         
         for key in keys_to_clear:
@@ -150,8 +151,17 @@ class SimpleAuth:
         if not self.is_authenticated():
             return None
         
+        # Memoized per session; keyed by user_id so a different login re-reads
         user_id = st.session_state.get('user_id')
-        return self.db.get_user_profile(user_id)
+        cached_user = st.session_state.get('_cached_user')
+        if cached_user is None or cached_user.get('id') != user_id:
+            cached_user = self.db.get_user_profile(user_id)
+            st.session_state['_cached_user'] = cached_user
+        return cached_user
+    
+    def invalidate_current_user(self):
+        """Drop the memoized user so the next get_current_user() re-reads the database"""
+        st.session_state.pop('_cached_user', None)
     
     def change_password(self, user_id, old_password, new_password):
         """Change user password"""
@@ -172,6 +182,7 @@ class SimpleAuth:
         success = self.db.update_user_profile(user_id, {'password_hash': new_hash})
         
         if success:
+            self.invalidate_current_user()
             return True, "Password updated successfully"
         else:
             return False, "Failed to update password"
@@ -2,16 +2,32 @@ import sqlite3
 import json
 from typing import Dict, Any, Optional, List
 import os
+import threading
 from datetime import datetime
 
 class Database:
     def __init__(self, db_path: str = "chatbot.db"):
         self.db_path = db_path
+        self._local = threading.local()
         self._init_db()
 
+    def _connect(self) -> sqlite3.Connection:
+        """Return this thread's pooled connection, opening it on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Used as a context manager exactly like sqlite3.connect(): commits on
+            # success, rolls back on error, but stays open for the next call
+            conn = sqlite3.connect(self.db_path, cached_statements=256)
+            # WAL lets each per-turn commit append to the log instead of syncing the
+            # main file, and readers no longer block on the writer
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
     def _init_db(self):
         """Initialize the database with required tables."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             
             # Create users table with both password and Google OAuth support
@@ -73,6 +89,7 @@ class Database:
             try:
                 cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_email ON users (email)')
                 cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_google_id ON users (google_id)')
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_created_at ON users (created_at)')
                 cursor.execute('CREATE INDEX IF NOT EXISTS idx_conversations_user_id ON conversations (user_id)')
                 cursor.execute('CREATE INDEX IF NOT EXISTS idx_sentiment_user_date ON sentiment_analysis (user_id, date)')
             except sqlite3.OperationalError:
@@ -122,7 +139,7 @@ class Database:
 
     def save_user_profile(self, profile: Dict[str, Any]) -> int:
         """Save user profile and return user_id."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             
             # Convert social_links and user_context to JSON strings
@@ -179,7 +196,7 @@ class Database:
 
     def get_user_profile(self, user_id: int) -> Optional[Dict[str, Any]]:
         """Retrieve user profile by user_id."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -229,7 +246,7 @@ class Database:
 
     def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
         """Retrieve user profile by email address."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -279,7 +296,7 @@ class Database:
 
     def get_user_by_google_id(self, google_id: str) -> Optional[Dict[str, Any]]:
         """Retrieve user profile by Google ID."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -308,7 +325,7 @@ class Database:
 
     def update_user_login(self, user_id: int):
         """Update the last login timestamp for a user."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = ?
@@ -317,7 +334,7 @@ class Database:
 
     def save_conversation(self, user_id: int, message: str, response: str, satisfaction_score: float) -> int:
         """Save a conversation exchange for a specific user and return conversation ID."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -337,7 +354,7 @@ class Database:
 
     def get_user_conversations(self, user_id: int, limit: int = 10) -> list:
         """Retrieve recent conversations for a specific user only."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             
             # Get the most recent conversations first, then reverse to show oldest first
@@ -377,7 +394,7 @@ class Database:
     def get_user_conversations_by_session(self, user_id: int, limit: int = 5) -> List[Dict[str, Any]]:
         """Retrieve conversations grouped by login session with aggregate scores."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 
                 # First, get session metadata
@@ -394,29 +411,37 @@ class Database:
                     LIMIT ?
                 ''', (user_id, limit))
                 
+                session_rows = cursor.fetchall()
+                if not session_rows:
+                    return []
+                
+                # Get the conversations for all listed sessions in one query, in chronological order
+                session_dates = [row[0] for row in session_rows]
+                placeholders = ','.join('?' * len(session_dates))
+                cursor.execute(f'''
+                    SELECT DATE(timestamp), message, response, timestamp
+                    FROM conversations
+                    WHERE user_id = ? AND DATE(timestamp) IN ({placeholders})
+                    ORDER BY timestamp ASC
+                ''', (user_id, *session_dates))
+                
+                # Create conversation pairs per session, summing their length in the same pass
+                pairs_by_date = {session_date: [] for session_date in session_dates}
+                chars_by_date = dict.fromkeys(session_dates, 0)
+                for conv_date, message, response, timestamp in cursor.fetchall():
+                    message, response = message.strip(), response.strip()
+                    pairs_by_date[conv_date].append({
+                        'message': message,
+                        'response': response,
+                        'timestamp': timestamp
+                    })
+                    chars_by_date[conv_date] += len(message) + len(response)
+                
                 sessions = []
-                for row in cursor.fetchall():
+                for row in session_rows:
                     session_date = row[0]
-                    
-                    # Get individual conversations for this session in chronological order
-                    cursor.execute('''
-                        SELECT message, response, timestamp
-                        FROM conversations
-                        WHERE user_id = ? AND DATE(timestamp) = ?
-                        ORDER BY timestamp ASC
-                    ''', (user_id, session_date))
-                    
-                    # Create conversation pairs in correct order
-                    conversation_pairs = []
-                    for conv_row in cursor.fetchall():
-                        conversation_pairs.append({
-                            'message': conv_row[0].strip(),
-                            'response': conv_row[1].strip(),
-                            'timestamp': conv_row[2]
-                        })
-                    
-                    # Calculate session metrics
-                    total_chars = sum(len(msg['message']) + len(msg['response']) for msg in conversation_pairs)
+                    conversation_pairs = pairs_by_date[session_date]
+                    total_chars = chars_by_date[session_date]
                     
                     sessions.append({
                         'session_date': session_date,
@@ -436,10 +461,19 @@ class Database:
 
     def get_all_users(self) -> list:
         """Retrieve all users (admin function)."""
-        with sqlite3.connect(self.db_path) as conn:
+        return self.get_users_page(limit=-1)
+
+    def get_users_page(self, limit: int, offset: int = 0) -> list:
+        """Retrieve one page of users ordered by id; a negative limit returns all (admin function)."""
+        with self._connect() as conn:
             cursor = conn.cursor()
             
-            cursor.execute('SELECT id, name, email, google_id, age, interests, social_links, user_context, created_at, last_login FROM users')
+            cursor.execute('''
+                SELECT id, name, email, google_id, age, interests, social_links, user_context, created_at, last_login, picture, occupation
+                FROM users
+                ORDER BY id
+                LIMIT ? OFFSET ?
+            ''', (limit, offset))
             users = []
             for row in cursor.fetchall():
                 # Handle None values safely for JSON fields
@@ -471,14 +505,44 @@ class Database:
                     'social_links': social_links,
                     'user_context': user_context,
                     'created_at': row[8],
-                    'last_login': row[9]
+                    'last_login': row[9],
+                    'picture': row[10],
+                    'occupation': row[11]
                 })
             return users
 
+    def get_user_count(self) -> int:
+        """Get the total number of registered users."""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT COUNT(*) FROM users')
+            return cursor.fetchone()[0]
+
+    def get_user_counts_by_auth_type(self) -> Dict[str, int]:
+        """Get user counts grouped by auth_type in a single query."""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT auth_type, COUNT(*) FROM users GROUP BY auth_type')
+            return dict(cursor.fetchall())
+
+    def get_recent_users(self, limit: int = 5) -> List[Dict[str, Any]]:
+        """Get the most recently registered users, newest first."""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, name, auth_type, created_at FROM users
+                ORDER BY created_at DESC
+                LIMIT ?
+            ''', (limit,))
+            return [
+                {'id': row[0], 'name': row[1], 'auth_type': row[2], 'created_at': row[3]}
+                for row in cursor.fetchall()
+            ]
+
     def delete_user_profile(self, user_id: int) -> bool:
         """Delete a user profile and associated conversations."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 
                 # First delete all conversations associated with the user
@@ -499,15 +563,36 @@ class Database:
 
     def get_user_conversation_count(self, user_id: int) -> int:
         """Get total conversation count for a user."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             cursor.execute('SELECT COUNT(*) FROM conversations WHERE user_id = ?', (user_id,))
             return cursor.fetchone()[0]
 
+    def get_latest_conversation_id(self, user_id: int) -> int:
+        """Get the id of a user's newest conversation (0 if none); changes on every save."""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT MAX(id) FROM conversations WHERE user_id = ?', (user_id,))
+            return cursor.fetchone()[0] or 0
+
+    def get_total_conversation_count(self) -> int:
+        """Get the total number of conversations across all users."""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT COUNT(*) FROM conversations')
+            return cursor.fetchone()[0]
+
+    def get_conversation_counts_by_user(self) -> Dict[int, int]:
+        """Get conversation counts for every user in a single query, keyed by user_id."""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT user_id, COUNT(*) FROM conversations GROUP BY user_id')
+            return dict(cursor.fetchall())
+
     def update_user_profile(self, user_id: int, profile_updates: Dict[str, Any]) -> bool:
         """Update specific fields in a user profile."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 
                 # Build dynamic update query
@@ -535,7 +620,7 @@ class Database:
     def save_sentiment_analysis(self, user_id: int, conversation_id: int, sentiment_data: Dict[str, Any]) -> bool:
         """Save sentiment analysis data for a conversation."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 
                 cursor.execute('''
@@ -564,7 +649,7 @@ class Database:
     def get_daily_sentiment_summary(self, user_id: int, days: int = 7) -> List[Dict[str, Any]]:
         """Get daily sentiment summaries for the last N days."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 
                 cursor.execute('''
@@ -597,7 +682,7 @@ class Database:
     def get_recent_sentiment_analysis(self, user_id: int, limit: int = 5) -> List[Dict[str, Any]]:
         """Get recent sentiment analyses for a user."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 
                 cursor.execute('''